@@ -5,39 +5,170 @@ import argparse
 from llama_crew.helper import get_openai_api_key
 OPENAI_API_KEY = get_openai_api_key()
 
+import asyncio
 import nest_asyncio
 nest_asyncio.apply()
 
 import yaml
-from llama_crew.tools import Tool, load_tools_config
+from llama_crew.tools import Tool, load_tools_config, tool_load_report
+from llama_crew.tools.code_pool import code_pool_stats
+from llama_crew.tools.clients import configure_http
+from llama_crew.tools.cache import tool_cache_stats
+from llama_crew.tools.batching import batcher_stats
 from llama_index.llms.openai import OpenAI
 from llama_crew.agents.orchestrator import Orchestrator
 from llama_crew.agents.loader import load_agents
+from llama_crew.agents.plan_cache import PlanCache
+from llama_crew.agents.execution import configure_execution_service
+from llama_crew.agents.router import AgentRouter
+from llama_crew.agents.agent_index import AgentIndex
+from llama_crew.llms import CONTROL_SITES, LLMResponseCache, PhaseMetrics, PhaseRoutedLLM, RateLimitedLLM, ResilientLLM, get_rate_limiter, install_llm_cache
 
 # get current path of the file
 import os
 current_path = os.path.dirname(os.path.abspath(__file__))
 defaults = {"tools_config": os.path.join(current_path,'tools.yaml'), "agents_config": os.path.join(current_path,'agents.yaml')}
 
-parser = argparse.ArgumentParser(description='Run the orchestrator')
-parser.add_argument('--tools_config', type=str, default=defaults["tools_config"], help='Path to the tools configuration file')
-parser.add_argument('--model', type=str, default='gpt-3.5-turbo', help='The model to use for the orchestrator')
-parser.add_argument('--api_key', type=str, default=OPENAI_API_KEY, help='The OpenAI API key')
-parser.add_argument('--api_base', type=str, default='https://api.openai.com/v1', help='The OpenAI API base URL')
-parser.add_argument('--agents_config', type=str, default=defaults["agents_config"], help='Path to the agents configuration file')
-parser.add_argument("--require_approval", action="store_true", help="Require approval for the plan before executing it")
-parser.add_argument("--verbose", action="store_true", help="Print out the responses from the agents and the evaluation of the responses.")
-parser.add_argument('query', nargs=argparse.REMAINDER, help='The query to send to the orchestrator')
-args = parser.parse_args()
+def print_event(event):
+    if event.kind == "step":
+        print(f"[{event.step.agent}] {event.content}\n", flush=True)
+    elif event.kind == "token":
+        print(event.content, end="", flush=True)
+    elif event.kind == "answer":
+        print(flush=True)
 
-tools_config = load_tools_config(args.tools_config)
-all_tools = [Tool(config) for config in tools_config["tools"]]
-llm = OpenAI(model=args.model,api_key=args.api_key, api_base=args.api_base)
+async def stream_async(director, query):
+    async for event in director.aquery_stream(query):
+        print_event(event)
 
-agents_config = yaml.safe_load(open(args.agents_config, 'r'))
 
-agents = load_agents(llm, agents_config, all_tools)
+def main():
+    parser = argparse.ArgumentParser(description='Run the orchestrator')
+    parser.add_argument('--tools_config', type=str, default=defaults["tools_config"], help='Path to the tools configuration file')
+    parser.add_argument('--model', type=str, default='gpt-3.5-turbo', help='The model to use for the orchestrator')
+    parser.add_argument('--api_key', type=str, default=OPENAI_API_KEY, help='The OpenAI API key')
+    parser.add_argument('--api_base', type=str, default='https://api.openai.com/v1', help='The OpenAI API base URL')
+    parser.add_argument('--agents_config', type=str, default=defaults["agents_config"], help='Path to the agents configuration file')
+    parser.add_argument("--require_approval", action="store_true", help="Require approval for the plan before executing it")
+    parser.add_argument("--verbose", action="store_true", help="Print out the responses from the agents and the evaluation of the responses.")
+    parser.add_argument("--use_async", action="store_true", help="Run the orchestrator on the asyncio path (Orchestrator.aquery).")
+    parser.add_argument("--max_concurrency", type=int, default=8, help="Maximum number of agent calls in flight at once on the asyncio path.")
+    parser.add_argument("--scheduler", choices=["groups", "dag", "stream"], default="groups", help="Run the plan as barrier-synchronized step groups, as a dependency graph, or as a dependency graph started while the plan is streamed in.")
+    parser.add_argument("--planning_mode", choices=["single", "two_call"], default="single", help="Group the plan steps locally from their dependencies (one planning call) or with a second LLM call.")
+    parser.add_argument("--plan_cache", type=str, default=None, help="Directory of the on-disk plan cache; repeated task shapes skip planning.")
+    parser.add_argument("--plan_cache_ttl", type=float, default=24 * 3600, help="Seconds a cached plan stays valid.")
+    parser.add_argument("--llm_cache", type=str, default=None, help="SQLite file of the LLM response cache; enables caching of completions.")
+    parser.add_argument("--llm_cache_ttl", type=float, default=24 * 3600, help="Seconds a cached LLM response stays valid.")
+    parser.add_argument("--early_stopping", choices=["speculative", "blocking", "off"], default="speculative", help="How the orchestrator decides to stop after a step group (can_stop).")
+    parser.add_argument("--stream", action="store_true", help="Print the agent results as they finish and the final answer as it is generated.")
+    parser.add_argument("--eval_mode", choices=["background", "sync", "off"], default="background", help="Evaluate the answer in the background, before returning it, or not at all.")
+    parser.add_argument("--eval_sample_rate", type=float, default=1.0, help="Fraction of the answers that are evaluated in background mode.")
+    parser.add_argument("--eval_log", type=str, default=None, help="JSONL file the background evaluations are appended to.")
+    parser.add_argument("--max_workers", type=int, default=16, help="Size of the worker pool shared by the agent calls.")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute allowed by the provider for the model.")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute allowed by the provider for the model.")
+    parser.add_argument("--step_timeout", type=float, default=None, help="Seconds an agent step may take before it is abandoned (agents can override it with `timeout`).")
+    parser.add_argument("--task_timeout", type=float, default=None, help="Seconds the whole task may take; the answer is combined from the results at hand.")
+    parser.add_argument("--hedge_after", type=float, default=None, help="Seconds after which a slow step is duplicated on another agent having all the tools of its agent; agents without such a twin in agents.yaml are not hedged.")
+    parser.add_argument("--llm_retries", type=int, default=3, help="Retries of an LLM call failing with a transient error (rate limit, timeout, 5xx).")
+    parser.add_argument("--no_llm_hedging", action="store_true", help="Do not duplicate LLM calls slower than the p95 latency of their call site.")
+    parser.add_argument("--routing", choices=["off", "bm25", "llm"], default="off", help="Send tasks one agent can answer alone straight to it, picked locally (bm25) or with one LLM call.")
+    parser.add_argument("--agent_index", type=str, default=None, help="Directory of the persisted agent index; the planner only sees the agents most relevant to the task.")
+    parser.add_argument("--planning_top_k", type=int, default=10, help="Number of agents listed in the planning prompt when the agent index is used.")
+    parser.add_argument("--combine_budget", type=int, default=6000, help="Tokens of agent responses the final combine call may take; larger responses are summarized in parallel first.")
+    parser.add_argument("--http_pool_size", type=int, default=32, help="Keep-alive connections per host of the shared HTTP session of the network tools.")
+    parser.add_argument("--http_timeout", type=float, default=30.0, help="Read timeout (seconds) of the HTTP requests of the network tools.")
+    parser.add_argument("--control_model", type=str, default=None, help="Model of the classification-like calls (can_stop, decompose_task, eval_response, route); overrides `models.control` of agents.yaml.")
+    parser.add_argument("--phase_model", action="append", default=[], metavar="SITE=MODEL", help="Model of one call site (generate_plan, combine_responses, can_stop, ...); can be repeated.")
+    parser.add_argument("--execution_report", action="store_true", help="Print the worker pool and rate limiter metrics after the query.")
+    parser.add_argument("--tool_report", action="store_true", help="Print the cold-start (import) time of each tool after the query.")
+    parser.add_argument('query', nargs=argparse.REMAINDER, help='The query to send to the orchestrator')
+    args = parser.parse_args()
 
-director = Orchestrator(llm, agents, agents_config=agents_config, verbose=args.verbose, require_approval=args.require_approval)
+    configure_http(pool_maxsize=args.http_pool_size, timeout=(5.0, args.http_timeout))
+    tools_config = load_tools_config(args.tools_config)
+    all_tools = [Tool(config) for config in tools_config["tools"]]
+    agents_config = yaml.safe_load(open(args.agents_config, 'r'))
+    models_config = agents_config.get("models") or {}
 
-director.query(" ".join(args.query))
+    llm_cache = LLMResponseCache(path=args.llm_cache, ttl=args.llm_cache_ttl) if args.llm_cache else None
+    resilient_llms = {}
+
+    def build_llm(model):
+        if model in resilient_llms:
+            llm = resilient_llms[model]
+        else:
+            llm = OpenAI(model=model, api_key=args.api_key, api_base=args.api_base)
+            if args.rpm or args.tpm:
+                # the cache sits in front of the limiter: cache hits do not use the provider budget
+                llm = RateLimitedLLM(llm, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+            # retries and hedged duplicates go through the rate limiter, cache hits skip them all
+            llm = resilient_llms[model] = ResilientLLM(llm, max_retries=args.llm_retries, hedge=not args.no_llm_hedging)
+        if llm_cache is not None:
+            llm = install_llm_cache(llm, cache=llm_cache)
+        return llm
+
+    # call site -> model: agents.yaml first, then the command line
+    phase_models = dict.fromkeys(CONTROL_SITES, models_config.get("control"))
+    phase_models.update(models_config.get("phases") or {})
+    if args.control_model:
+        phase_models.update(dict.fromkeys(CONTROL_SITES, args.control_model))
+    for phase in args.phase_model:
+        site, _, model = phase.partition("=")
+        if not site.strip() or not model.strip():
+            parser.error(f"--phase_model expects SITE=MODEL, got '{phase}'")
+        phase_models[site.strip()] = model.strip()
+    phase_metrics = PhaseMetrics(prices=models_config.get("prices"))
+    llm = PhaseRoutedLLM(build_llm(args.model), phases={site: build_llm(model) for site, model in phase_models.items() if model and model != args.model}, metrics=phase_metrics)
+
+    execution = configure_execution_service(max_workers=args.max_workers)
+
+    agents = load_agents(llm, agents_config, all_tools, llm_factory=lambda model: PhaseRoutedLLM(build_llm(model), metrics=phase_metrics))
+
+    plan_cache = PlanCache(ttl=args.plan_cache_ttl, persist_dir=args.plan_cache) if args.plan_cache else None
+
+    agent_index = AgentIndex(agents_config, tools=all_tools, persist_dir=args.agent_index) if args.agent_index or args.routing != "off" else None
+    router = AgentRouter(agents_config, mode=args.routing, llm=llm, index=agent_index) if args.routing != "off" else None
+
+    director = Orchestrator(llm, agents, agents_config=agents_config, router=router, agent_index=agent_index if args.agent_index else None, planning_top_k=args.planning_top_k, combine_budget=args.combine_budget, verbose=args.verbose, require_approval=args.require_approval, max_concurrency=args.max_concurrency, scheduler=args.scheduler, planning_mode=args.planning_mode, plan_cache=plan_cache, early_stopping=args.early_stopping,
+                            step_timeout=args.step_timeout, task_timeout=args.task_timeout, hedge_after=args.hedge_after,
+                            eval_mode=args.eval_mode, eval_sample_rate=args.eval_sample_rate, eval_sink=args.eval_log)
+
+    if args.stream and args.use_async:
+        asyncio.run(stream_async(director, " ".join(args.query)))
+    elif args.stream:
+        for event in director.query_stream(" ".join(args.query)):
+            print_event(event)
+    elif args.use_async:
+        asyncio.run(director.aquery(" ".join(args.query)))
+    else:
+        director.query(" ".join(args.query))
+    director.close()
+
+    if args.execution_report:
+        print(f"Execution: {execution.stats()}")
+        if router is not None:
+            print(f"Routing: {router.stats()}")
+        for model, resilient_llm in resilient_llms.items():
+            print(f"LLM calls ({model}): {resilient_llm.stats()}")
+            for site, stats in resilient_llm.latency_stats().items():
+                print(f"  {site}: {stats}")
+            if args.rpm or args.tpm:
+                print(f"  Rate limiter: {get_rate_limiter(model, args.api_base).stats()}")
+        for name, stats in tool_cache_stats().items():
+            if stats["hits"] + stats["misses"] + stats["shared"]:
+                print(f"Tool cache ({name}): {stats}")
+        for name, stats in batcher_stats().items():
+            if stats["lookups"]:
+                print(f"Batching ({name}): {stats}")
+        if code_pool_stats() is not None:
+            print(f"Code pool: {code_pool_stats()}")
+        print(phase_metrics.report())
+
+    if args.tool_report:
+        print(tool_load_report(all_tools))
+
+
+# the code pool workers import this script again: only run the CLI in the main process
+if __name__ == "__main__":
+    main()
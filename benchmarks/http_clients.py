@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Per-call latency of the network tools' HTTP requests: a new connection per call against the
+shared keep-alive session of llama_crew.tools.clients.
+
+Runs a local mock HTTP server. ``--handshake_ms`` delays every new connection to stand in for the
+TCP and TLS handshakes with a remote API (one to a few round trips); keep-alive requests skip it.
+
+    python benchmarks/http_clients.py --calls 200 --threads 1 8 --handshake_ms 60
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_crew.tools.clients import configure_http, get_session
+
+BODY = json.dumps([{"id": "bitcoin", "current_price": 65000.0, "market_cap": 1.2e12}] * 10).encode()
+
+
+class MockAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # one write per response and no Nagle delay, or delayed ACKs add ~40 ms to every keep-alive request
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    handshake = 0.0
+    response_ms = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with MockAPI.lock:
+            MockAPI.connections += 1
+        time.sleep(self.handshake)
+
+    def do_GET(self):
+        time.sleep(self.response_ms / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def timed(get, url):
+    start = time.perf_counter()
+    response = get(url, params={"vs_currency": "usd"}, timeout=10)
+    response.json()
+    return time.perf_counter() - start
+
+
+def run(name, get, url, calls, threads):
+    MockAPI.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        latencies = list(executor.map(lambda _: timed(get, url), range(calls)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    print(f"{name:<18} {threads:>7} {statistics.mean(latencies) * 1000:>9.2f} {latencies[len(latencies) // 2] * 1000:>9.2f} "
+          f"{latencies[int(0.95 * len(latencies))] * 1000:>9.2f} {calls / wall:>9.1f} {MockAPI.connections:>11}")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--handshake_ms", type=float, default=60.0, help="Delay of every new connection.")
+    parser.add_argument("--response_ms", type=float, default=5.0, help="Server time of every request.")
+    args = parser.parse_args()
+
+    MockAPI.handshake = args.handshake_ms / 1000
+    MockAPI.response_ms = args.response_ms
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAPI)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v3/coins/markets"
+
+    print(f"{args.calls} calls, {args.handshake_ms:.0f} ms per new connection, {args.response_ms:.0f} ms per request\n")
+    print(f"{'client':<18} {'threads':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'calls/s':>9} {'connections':>11}")
+    for threads in args.threads:
+        configure_http(pool_maxsize=max(threads, 1))
+        fresh = run("requests.get", requests.get, url, args.calls, threads)
+        pooled = run("shared session", get_session().get, url, args.calls, threads)
+        print(f"{'':<18} saved {(fresh - pooled) * 1000:.2f} ms per call ({(1 - pooled / fresh) * 100:.0f}%)\n")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
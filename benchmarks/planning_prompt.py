@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Planning prompt size and planner latency against the size of the agent roster.
+
+Builds synthetic rosters of specialised agents, then compares the planning prompt listing every
+agent with the one listing the top-k agents of the AgentIndex (tokens, selection time, whether
+the agent the task was written for is among the selected ones).
+
+    python benchmarks/planning_prompt.py --sizes 10 100 500
+    python benchmarks/planning_prompt.py --model gpt-3.5-turbo   # also time the planner call
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_crew.agents.agent_index import AgentIndex
+from llama_crew.agents.orchestrator import Orchestrator
+from llama_crew.llms.rate_limit import estimate_tokens
+
+DOMAINS = ["stock", "crypto", "forex", "weather", "travel", "legal", "medical", "tax", "chemistry", "physics",
+           "history", "music", "sports", "cooking", "gardening", "energy", "shipping", "insurance", "real estate", "security"]
+SPECIALTIES = ["prices", "news", "regulation", "forecasts", "statistics", "glossary", "calculations", "reports",
+               "comparisons", "recommendations", "translations", "summaries", "schedules", "risks", "records"]
+
+
+def load_encoder():
+    # tiktoken downloads its vocabulary on first use; offline, tokens are estimated from the length
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+ENCODER = load_encoder()
+
+
+def count_tokens(text):
+    if ENCODER is None:
+        return estimate_tokens(text)
+    return len(ENCODER.encode(text))
+
+
+def roster(size, seed=0):
+    rng = random.Random(seed)
+    pairs = [(domain, specialty) for domain in DOMAINS for specialty in SPECIALTIES]
+    rng.shuffle(pairs)
+    agents = []
+    for i in range(size):
+        domain, specialty = pairs[i % len(pairs)]
+        agents.append({
+            "name": f"{domain.replace(' ', '_')}_{specialty}_{i}",
+            "role": f"Answers questions about {domain} {specialty}",
+            "prompt": f"You are an expert in {domain} {specialty}.",
+        })
+    return {"agents": agents}
+
+
+def task_for(agent):
+    return f"What are the latest {agent['role'].split('about ', 1)[1]} I should know about?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=20, help="tasks per roster size")
+    parser.add_argument("--model", type=str, default=None, help="OpenAI model to time the planner call with")
+    args = parser.parse_args()
+
+    llm = None
+    if args.model:
+        from llama_index.llms.openai import OpenAI
+        llm = OpenAI(model=args.model)
+
+    header = f"{'agents':>7} {'full tok':>9} {'top-k tok':>10} {'build ms':>9} {'load ms':>8} {'select ms':>10} {'recall':>7}"
+    if llm is not None:
+        header += f" {'full plan s':>12} {'top-k plan s':>13}"
+    print(header)
+    with tempfile.TemporaryDirectory() as persist_dir:
+        for size in args.sizes:
+            config = roster(size)
+            start = time.perf_counter()
+            index = AgentIndex(config, persist_dir=persist_dir)
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            AgentIndex(config, persist_dir=persist_dir)
+            load = time.perf_counter() - start
+
+            agents = {agent["name"]: None for agent in config["agents"]}
+            full = Orchestrator(llm, agents, agents_config=config, eval_mode="off")
+            selective = Orchestrator(llm, agents, agents_config=config, eval_mode="off", agent_index=index, planning_top_k=args.top_k)
+            targets = random.Random(size).sample(config["agents"], min(args.tasks, size))
+            full_tokens, top_tokens, select_times, hits, full_latency, top_latency = [], [], [], 0, [], []
+            for agent in targets:
+                task = task_for(agent)
+                full_tokens.append(count_tokens(full.planning_prompt(task)))
+                start = time.perf_counter()
+                selected = selective.planning_agents(task)
+                select_times.append(time.perf_counter() - start)
+                hits += agent in selected
+                top_tokens.append(count_tokens(selective.planning_prompt(task)))
+                if llm is not None:
+                    for orchestrator, latencies in ((full, full_latency), (selective, top_latency)):
+                        start = time.perf_counter()
+                        llm.complete(orchestrator.planning_prompt(task))
+                        latencies.append(time.perf_counter() - start)
+            line = (f"{size:>7} {statistics.mean(full_tokens):>9.0f} {statistics.mean(top_tokens):>10.0f} "
+                    f"{build * 1000:>9.1f} {load * 1000:>8.1f} {statistics.mean(select_times) * 1000:>10.2f} "
+                    f"{hits / len(targets):>7.0%}")
+            if llm is not None:
+                line += f" {statistics.mean(full_latency):>12.2f} {statistics.mean(top_latency):>13.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
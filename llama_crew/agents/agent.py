@@ -15,6 +15,7 @@ from llama_index.core.bridge.pydantic import PrivateAttr
 from typing import Dict, Any, Tuple, Optional
 from llama_index.core.selectors import PydanticSingleSelector
 from llama_crew.chat.utils import DEFAULT_PROMPT_STR
+from llama_crew.llms import call_site
 from datetime import datetime, timedelta, timezone, time
 import json
 
@@ -74,7 +75,7 @@ class Orchestrator:
             responses.append(response)
             if (self.can_stop(task, responses)):
                 break
-        combined_responses = " ".join(str(responses))
+        combined_responses = "\n\n".join(str(response) for response in responses)
         combined_response = self.combine_responses(task, combined_responses)
         eval_response = self.eval_response(task, "orchestrator", task, combined_response)
         if self.verbose:
@@ -148,15 +149,7 @@ class SimpleAgentWorker(CustomSimpleAgentWorker):
         """Initialize state."""
         return {"count": 0, "current_reasoning": []}
 
-    def _run_step(
-        self, state: Dict[str, Any], task: Task, input: Optional[str] = None
-    ) -> Tuple[AgentChatResponse, bool]:
-        """Run step.
-
-        Returns:
-            Tuple of (agent_response, is_done)
-
-        """
+    def _step_input(self, state: Dict[str, Any], task: Task) -> str:
         if "new_input" not in state:
             new_input = task.input
         else:
@@ -167,9 +160,11 @@ class SimpleAgentWorker(CustomSimpleAgentWorker):
         
         if self.verbose:
             print(f"> Prompt: {self.role_prompt}")
-        response = self.llm.complete(self.role_prompt + new_input)
+        return new_input
 
-            
+    def _step_output(
+        self, state: Dict[str, Any], new_input: str, response: Any
+    ) -> Tuple[AgentChatResponse, bool]:
         # append to current reasoning
         state["current_reasoning"].extend(
             [("user", new_input), ("assistant", str(response))]
@@ -185,6 +180,34 @@ class SimpleAgentWorker(CustomSimpleAgentWorker):
         # return response
         return AgentChatResponse(response=str(response)), is_done
 
+    def _run_step(
+        self, state: Dict[str, Any], task: Task, input: Optional[str] = None
+    ) -> Tuple[AgentChatResponse, bool]:
+        """Run step.
+
+        Returns:
+            Tuple of (agent_response, is_done)
+
+        """
+        new_input = self._step_input(state, task)
+        with call_site("agent"):
+            response = self.llm.complete(self.role_prompt + new_input)
+        return self._step_output(state, new_input, response)
+
+    async def _arun_step(
+        self, state: Dict[str, Any], task: Task, input: Optional[str] = None
+    ) -> Tuple[AgentChatResponse, bool]:
+        """Run step (async).
+
+        Returns:
+            Tuple of (agent_response, is_done)
+
+        """
+        new_input = self._step_input(state, task)
+        with call_site("agent"):
+            response = await self.llm.acomplete(self.role_prompt + new_input)
+        return self._step_output(state, new_input, response)
+
     def _finalize_task(self, state: Dict[str, Any], **kwargs) -> None:
         """Finalize task."""
         # nothing to finalize here
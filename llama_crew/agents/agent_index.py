@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+from llama_crew.retrieval import BM25
+from llama_crew.tools.lazy import read_function_metadata
+
+
+def tool_description(tool):
+    # read from the tool's source, without importing it
+    if tool.params is not None:
+        return tool.params.get("description", "")
+    metadata = read_function_metadata(tool.module, tool.function)
+    return metadata[0] if metadata is not None and metadata[0] else ""
+
+
+def agent_document(agent, tools=None):
+    names = agent.get("tools", [])
+    names = [names] if isinstance(names, str) else names
+    descriptions = [tool_description(tool) for tool in tools or [] if tool.name in names]
+    return " ".join([agent["name"], agent.get("role", ""), agent.get("prompt", ""), *names, *descriptions])
+
+
+class AgentIndex:
+    """BM25 index of the agents of agents.yaml: their name, role, prompt, tools and tool descriptions.
+
+    With ``persist_dir`` the index is saved under the hash of the indexed documents, so it is
+    built once per roster and loaded by the next processes; a change of the agents or of the
+    descriptions of their tools gives a new index.
+    """
+
+    def __init__(self, agents_config, tools=None, persist_dir=None):
+        self.agents = list(agents_config["agents"])
+        documents = [agent_document(agent, tools) for agent in self.agents]
+        self.key = hashlib.sha256(json.dumps(documents).encode()).hexdigest()
+        self.path = os.path.join(persist_dir, f"agents-{self.key[:32]}.json") if persist_dir else None
+        self.loaded = False
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as file:
+                self.bm25 = BM25.from_dict(json.load(file))
+            self.loaded = True
+        else:
+            self.bm25 = BM25(documents)
+            if self.path:
+                os.makedirs(persist_dir, exist_ok=True)
+                with open(self.path, "w") as file:
+                    json.dump(self.bm25.to_dict(), file)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def ranked(self, query, k):
+        """``(agent config, score)`` pairs of the ``k`` agents matching ``query`` best."""
+        return [(self.agents[index], score) for index, score in self.bm25.top_k(query, k)]
+
+    def select(self, task, k):
+        """The agents to show the planner for ``task``: the ``k`` best matches, the whole roster if it is that small."""
+        if len(self.agents) <= k:
+            return self.agents
+        selected = [agent for agent, _ in self.ranked(task, k)]
+        # a task matching no agent gets the first agents of the roster rather than none
+        return selected or self.agents[:k]
@@ -0,0 +1,174 @@
+import asyncio
+import re
+
+from llama_crew.llms import call_site
+from llama_crew.llms.rate_limit import estimate_tokens
+from .execution import get_execution_service
+from .scheduler import MissingResult
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text, size=3):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def deduplicate(responses, threshold=0.8):
+    """Drops the paragraphs of the responses that repeat an earlier paragraph.
+
+    Two paragraphs overlap when they share at least ``threshold`` of the word trigrams of the
+    shorter one; a response left without paragraphs is dropped. Failure notes are kept as they are.
+    """
+    kept = []
+    seen = []
+    for response in responses:
+        if isinstance(response, MissingResult):
+            kept.append(response)
+            continue
+        paragraphs = []
+        for paragraph in re.split(r"\n\s*\n", str(response)):
+            grams = shingles(paragraph)
+            if not grams:
+                continue
+            if any(len(grams & other) >= threshold * min(len(grams), len(other)) for other in seen):
+                continue
+            seen.append(grams)
+            paragraphs.append(paragraph.strip())
+        if paragraphs:
+            kept.append("\n\n".join(paragraphs))
+    return kept
+
+
+def split_text(text, max_tokens):
+    """Cuts a text larger than ``max_tokens`` into pieces, at paragraph and then line boundaries."""
+    pieces, current = [], ""
+    for part in re.split(r"(\n\s*\n|\n)", text):
+        if current and estimate_tokens(current + part) > max_tokens:
+            pieces.append(current)
+            current = ""
+        while estimate_tokens(part) > max_tokens:
+            # a single line over the budget is cut at the character estimate
+            cut = max_tokens * 4
+            pieces.append(part[:cut])
+            part = part[cut:]
+        current += part
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def pack(responses, max_tokens):
+    """Groups the responses in order into groups of at most ``max_tokens`` tokens."""
+    groups, current, size = [], [], 0
+    for response in responses:
+        for piece in split_text(str(response), max_tokens) if estimate_tokens(response) > max_tokens else [response]:
+            tokens = estimate_tokens(piece)
+            if current and size + tokens > max_tokens:
+                groups.append(current)
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def truncate(responses, max_tokens):
+    """The start of the responses, in order, cut to at most ``max_tokens`` tokens."""
+    kept, size = [], 0
+    for response in responses:
+        for piece in split_text(str(response), max_tokens) if estimate_tokens(response) > max_tokens else [response]:
+            tokens = estimate_tokens(piece)
+            if size + tokens > max_tokens:
+                # the piece that does not fit is cut to the tokens left
+                rest = split_text(str(piece), max_tokens - size)[:1] if max_tokens > size else []
+                return kept + rest
+            kept.append(piece)
+            size += tokens
+    return kept
+
+
+class TokenBudgetCombiner:
+    """Brings the agent responses within the token budget of the final combine prompt.
+
+    Responses are deduplicated first; if they still exceed ``token_budget``, they are packed into
+    groups of at most ``group_tokens`` tokens, every group is summarized in parallel with respect
+    to the query, and the summaries are reduced the same way until they fit.
+
+    Args:
+        llm: the LLM summarizing the groups (calls tagged with the "combine_reduce" call site).
+        token_budget (int): tokens of agent responses the final combine prompt may hold.
+        group_tokens (int): tokens of responses per summary call, ``token_budget`` by default.
+        dedupe_threshold (float): trigram overlap above which a paragraph counts as a repeat.
+        execution: the ExecutionService running the group summaries of the threaded path.
+    """
+
+    reduce_prompt = (
+        "Given the following original query from the user:\n{query}\n\n"
+        "Condense these partial responses from agents into one response that keeps every fact, figure "
+        "and source relevant to the query, without repetitions:\n\n{responses}"
+    )
+
+    def __init__(self, llm, token_budget=6000, group_tokens=None, dedupe_threshold=0.8, execution=None, verbose=False):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.group_tokens = group_tokens or token_budget
+        self.dedupe_threshold = dedupe_threshold
+        self.execution = execution or get_execution_service()
+        self.verbose = verbose
+
+    def size(self, responses):
+        return sum(estimate_tokens(response) for response in responses)
+
+    def _groups(self, responses):
+        return pack(responses, self.group_tokens)
+
+    def _prompt(self, query, group):
+        return self.reduce_prompt.format(query=query, responses="\n\n".join(f"- {response}" for response in group))
+
+    def _summarize(self, query, group):
+        with call_site("combine_reduce"):
+            return str(self.llm.complete(self._prompt(query, group)))
+
+    async def _asummarize(self, query, group):
+        with call_site("combine_reduce"):
+            return str(await self.llm.acomplete(self._prompt(query, group)))
+
+    def _level(self, responses, summaries):
+        # notes are carried over untouched, so the combiner still knows what is missing
+        notes = [response for response in responses if isinstance(response, MissingResult)]
+        reduced = notes + summaries
+        if self.size(reduced) >= self.size(responses):
+            # the summaries did not shrink the responses: truncate rather than loop, the summaries to the
+            # budget the notes leave (the notes themselves only if they alone exceed the budget)
+            budget = self.token_budget - self.size(notes)
+            if budget <= 0:
+                return truncate(notes, self.token_budget)
+            return notes + truncate(summaries, budget)
+        return reduced
+
+    def _prepare(self, responses):
+        responses = deduplicate(responses, self.dedupe_threshold)
+        if self.verbose:
+            print(f"Combining {len(responses)} responses, {self.size(responses)} tokens (budget {self.token_budget})")
+        return responses
+
+    def reduce(self, query, responses):
+        """The responses, deduplicated and summarized in parallel until they fit the token budget."""
+        responses = self._prepare(responses)
+        while self.size(responses) > self.token_budget:
+            contents = [response for response in responses if not isinstance(response, MissingResult)]
+            futures = [self.execution.submit(self._summarize, query, group, key="combiner") for group in self._groups(contents)]
+            responses = self._level(responses, [future.result() for future in futures])
+        return responses
+
+    async def areduce(self, query, responses):
+        responses = self._prepare(responses)
+        while self.size(responses) > self.token_budget:
+            contents = [response for response in responses if not isinstance(response, MissingResult)]
+            summaries = await asyncio.gather(*(self._asummarize(query, group) for group in self._groups(contents)))
+            responses = self._level(responses, list(summaries))
+        return responses
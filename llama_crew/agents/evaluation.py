@@ -0,0 +1,126 @@
+import json
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+
+class JsonlSink:
+    """Appends evaluation records to a JSONL file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(record, default=str) + "\n")
+
+
+class BackgroundEvaluator:
+    """Evaluates answers off the response path, on a worker thread.
+
+    Args:
+        evaluate: ``evaluate(task, response)`` returns the evaluation (e.g. Orchestrator.eval_response).
+        sink: callable receiving each record, or the path of a JSONL file.
+        sample_rate (float): fraction of the submitted answers that get evaluated.
+        max_queue (int): answers waiting for evaluation; when full, new ones are dropped rather than blocking.
+    """
+
+    def __init__(self, evaluate, sink=None, sample_rate=1.0, max_queue=100, verbose=False):
+        self.evaluate = evaluate
+        self.sink = JsonlSink(sink) if isinstance(sink, str) else sink
+        self.sample_rate = sample_rate
+        self.verbose = verbose
+        self.submitted = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.evaluated = 0
+        self.failed = 0
+        # the counters are updated by the callers of submit and by the worker
+        self._lock = threading.Lock()
+        self._closed = False
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = threading.Thread(target=self._run, name="background-evaluator", daemon=True)
+        self._worker.start()
+
+    def submit(self, task, response):
+        """Queues an answer for evaluation; returns False if it was sampled out or dropped (or the evaluator is closed)."""
+        with self._lock:
+            self.submitted += 1
+            if self._closed:
+                self.dropped += 1
+                return False
+            if random.random() >= self.sample_rate:
+                self.sampled_out += 1
+                return False
+            try:
+                self._queue.put_nowait((task, str(response), time.time()))
+            except queue.Full:
+                self.dropped += 1
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._evaluate(*item)
+            finally:
+                self._queue.task_done()
+
+    def _evaluate(self, task, response, submitted_at):
+        queue_wait = time.time() - submitted_at
+        start = time.perf_counter()
+        try:
+            evaluation = self.evaluate(task, response)
+        except Exception as exc:
+            with self._lock:
+                self.failed += 1
+            if self.verbose:
+                print(f"Evaluation generated an exception: {exc}")
+            return
+        with self._lock:
+            self.evaluated += 1
+        record = {
+            "time": datetime.fromtimestamp(submitted_at).isoformat(),
+            "task": task,
+            "response": response,
+            "evaluation": str(evaluation),
+            "queue_wait": queue_wait,
+            "latency": time.perf_counter() - start,
+        }
+        if self.verbose:
+            print(f"Response evaluation: {evaluation}")
+        if self.sink is not None:
+            self.sink(record)
+
+    def flush(self):
+        """Blocks until every queued answer has been evaluated."""
+        self._queue.join()
+
+    def close(self):
+        """Evaluates the queued answers and stops the worker; later calls do nothing."""
+        with self._lock:
+            if self._closed:
+                return
+            # answers submitted from now on are dropped, the worker gets no item after the None
+            self._closed = True
+        self.flush()
+        self._queue.put(None)
+        self._worker.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "sampled_out": self.sampled_out,
+                "dropped": self.dropped,
+                "evaluated": self.evaluated,
+                "failed": self.failed,
+                "queued": self._queue.qsize(),
+            }
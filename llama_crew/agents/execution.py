@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+
+class TaskFuture(Future):
+    """Future of an ExecutionService task: cancelling it while it runs abandons the task.
+
+    A running thread cannot be interrupted, so ``cancel()`` still returns False, but the task no
+    longer counts against the cap of its key: the next queued task of the key starts right away and
+    the abandoned one finishes in the background (bounded by the timeouts of its LLM and HTTP calls).
+    """
+
+    def __init__(self, service):
+        super().__init__()
+        self._service = service
+
+    def cancel(self):
+        if super().cancel():
+            return True
+        if not self.done():
+            self._service._release(self, abandoned=True)
+        return False
+
+
+class ExecutionService:
+    """Process-wide worker pool shared by the orchestrators and their agents.
+
+    Work is submitted with a ``key`` (the agent name); keys with a concurrency cap only get that many
+    tasks running at once, the others wait in a per-key queue without holding a pool thread. A
+    straggler abandoned with ``future.cancel()`` gives its slot back at once (see TaskFuture).
+
+    Args:
+        max_workers (int): size of the persistent thread pool.
+        agent_limits (dict): agent name -> maximum concurrent tasks.
+        default_limit (int): cap for keys without an explicit limit, None for no cap.
+    """
+
+    def __init__(self, max_workers=16, agent_limits=None, default_limit=None):
+        self.max_workers = max_workers
+        self.agent_limits = dict(agent_limits or {})
+        self.default_limit = default_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llama-crew")
+        self._lock = threading.Lock()
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._holding = {}  # future -> key, for the tasks holding a slot of their key
+        self._queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.abandoned = 0
+        self.max_queue_depth = 0
+        self._total_queue_wait = 0.0
+
+    def set_agent_limits(self, limits):
+        with self._lock:
+            self.agent_limits.update(limits)
+
+    def _limit(self, key):
+        return self.agent_limits.get(key, self.default_limit)
+
+    def submit(self, fn, *args, key=None, **kwargs):
+        future = TaskFuture(self)
+        item = (future, fn, args, kwargs, key, time.perf_counter())
+        with self._lock:
+            self.submitted += 1
+            self._queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queued)
+            limit = self._limit(key)
+            if limit is not None and self._running[key] >= limit:
+                self._waiting[key].append(item)
+            else:
+                self._start(item)
+        return future
+
+    def _start(self, item):
+        # called with the lock held
+        self._running[item[4]] += 1
+        self._holding[item[0]] = item[4]
+        self._executor.submit(self._run, item)
+
+    def _release(self, future, abandoned=False):
+        # frees the slot of a task once, when it ends or when it is abandoned
+        with self._lock:
+            if future not in self._holding:
+                return
+            key = self._holding.pop(future)
+            self._running[key] -= 1
+            if abandoned:
+                self.abandoned += 1
+            if self._waiting[key]:
+                self._start(self._waiting[key].popleft())
+
+    def _run(self, item):
+        future, fn, args, kwargs, key, submitted_at = item
+        with self._lock:
+            self._queued -= 1
+            self._total_queue_wait += time.perf_counter() - submitted_at
+        try:
+            # a cancelled future is skipped, but still frees its slot below
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as exc:
+                    # counted before the future is resolved, so its callers see it in stats()
+                    with self._lock:
+                        self.failed += 1
+                    future.set_exception(exc)
+                else:
+                    with self._lock:
+                        self.completed += 1
+                    future.set_result(result)
+        finally:
+            self._release(future)
+
+    def stats(self):
+        with self._lock:
+            started = self.submitted - self._queued
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                # running tasks given up on (e.g. steps past their deadline) whose slot was freed
+                "abandoned": self.abandoned,
+                "queue_depth": self._queued,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_queue_wait": self._total_queue_wait / started if started else 0.0,
+                "running": {key: n for key, n in self._running.items() if n},
+                "waiting": {key: len(q) for key, q in self._waiting.items() if q},
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def hedge(primary, launch_backup, delay):
+    """Future of the first successful result of ``primary`` and a backup started ``delay`` seconds later.
+
+    ``launch_backup()`` submits the duplicate request and returns its future; it is only called if
+    ``primary`` has not finished by then. Cancelling the returned future cancels both requests.
+    """
+    result = Future()
+    attempts = [primary]
+    lock = threading.Lock()
+
+    def settle(future):
+        if future.cancelled():
+            return
+        with lock:
+            exc = future.exception()
+            if exc is not None and not all(attempt.done() for attempt in attempts):
+                return  # the other request may still succeed
+            try:
+                if exc is None:
+                    result.set_result(future.result())
+                else:
+                    result.set_exception(exc)
+            except InvalidStateError:
+                return  # already settled by the other request, or cancelled
+        for attempt in attempts:
+            if attempt is not future:
+                attempt.cancel()
+
+    def start_backup():
+        with lock:
+            if primary.done() or result.done():
+                return
+            backup = launch_backup()
+            attempts.append(backup)
+        backup.add_done_callback(settle)
+
+    def on_done(future):
+        timer.cancel()
+        if future.cancelled():
+            for attempt in attempts:
+                attempt.cancel()
+
+    timer = threading.Timer(delay, start_backup)
+    timer.daemon = True
+    primary.add_done_callback(settle)
+    result.add_done_callback(on_done)
+    timer.start()
+    return result
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_execution_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ExecutionService()
+        return _service
+
+
+def configure_execution_service(**kwargs):
+    """Replaces the process-wide service, e.g. ``configure_execution_service(max_workers=32)``."""
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.shutdown(wait=False)
+        _service = ExecutionService(**kwargs)
+        return _service
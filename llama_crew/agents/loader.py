@@ -2,19 +2,30 @@ from llama_index.core.tools import FunctionTool
 from .agent import SimpleAgentWorker
 from llama_index.core.agent import FunctionCallingAgentWorker
 from llama_index.core.agent import AgentRunner
+from llama_crew.llms import function_calling_llm, install_llm_cache
 
 
-def load_agents(llm, agents_config, all_tools):
+def load_agents(llm, agents_config, all_tools, llm_cache=None, llm_factory=None):
+    # with an LLMResponseCache, the completions of the LLM-only agents are memoized
+    if llm_cache is not None:
+        llm = install_llm_cache(llm, cache=llm_cache)
     agents = {}
     for agent_config in agents_config["agents"]:
+        # an agent with its own `model` gets an LLM built by `llm_factory` (e.g. a small model for simple tools)
+        agent_llm = llm
+        if agent_config.get("model") and llm_factory is not None:
+            agent_llm = llm_factory(agent_config["model"])
+            if llm_cache is not None:
+                agent_llm = install_llm_cache(agent_llm, cache=llm_cache)
         initial_tools = [ FunctionTool.from_defaults(fn=fn.instance) for fn in all_tools if fn.name  in agent_config.get("tools",[]) and fn.asis == False]
         initial_tools += [ fn.instance for fn in all_tools if fn.name  in agent_config.get("tools",[]) and fn.asis == True]
         if len(initial_tools) == 0:
-            agent_worker = SimpleAgentWorker(llm=llm, role_prompt=agent_config["prompt"], can_delegate=agent_config.get("can_delegate",False), verbose=True)
+            agent_worker = SimpleAgentWorker(llm=agent_llm, role_prompt=agent_config["prompt"], can_delegate=agent_config.get("can_delegate",False), verbose=True)
         else:
+            # the provider LLM prepares the tool calls, the requests still go through the wrappers (rate limits, retries)
             agent_worker = FunctionCallingAgentWorker.from_tools(
                 initial_tools, 
-                llm=llm, 
+                llm=function_calling_llm(agent_llm), 
                 verbose=True
             )
         agent = AgentRunner(agent_worker)
@@ -2,73 +2,228 @@
 # https://github.com/run-llama/llama_index/blob/767de070b231fb328b6c0640c2e002c9c7af0a83/docs/docs/examples/agent/custom_agent.ipynb#L12
 
 from typing import List
-from llama_index.core.bridge.pydantic import Field, BaseModel
+from llama_index.core.bridge.pydantic import Field, BaseModel, PrivateAttr
 from llama_index.core.output_parsers import PydanticOutputParser
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import wait, FIRST_COMPLETED
+import asyncio
+import queue
+import threading
 
 from typing import Dict, Any, Tuple, Optional
 from datetime import datetime
 import json
+import time
+from llama_crew.llms import call_site, extract_json, repair_prompt
+from .evaluation import BackgroundEvaluator
+from .combiner import TokenBudgetCombiner
+from .execution import get_execution_service, hedge
+from .plan_stream import PlanStreamParser
+from .scheduler import DagExecutor, StepFeed, earliest, failure_note, is_partial, normalize_dependencies, time_left, topological_levels
 
 class Task(BaseModel):
     input: str
     context: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
-    
+
 class Step(BaseModel):
     agent: str
     subtask: str
-    
+    id: int = Field(default=0, description="Unique number of the step in the plan, starting at 1.")
+    depends_on: List[int] = Field(default_factory=list, description="Ids of the steps whose results this step needs. Empty if the step can start right away.")
+
 class ParallelSteps(BaseModel):
     steps: List[List[Step]]
 
 class Plan(BaseModel):
     goal: str
     steps: List[Step]
+    # whether the planner stated the dependencies of the steps (not part of the planner schema)
+    _dependencies_known: bool = PrivateAttr(default=False)
+    # steps of a streamed plan that were skipped as invalid: such a plan is not cached
+    _skipped_steps: int = PrivateAttr(default=0)
+class StreamEvent(BaseModel):
+    kind: str  # "step", "token" or "answer"
+    content: str = ""
+    step: Optional[Step] = None
+
 class Orchestrator:
     system_prompt = (
         "DATE: {todays_date}\n\n"
         "You are the orchestrator. At your disposal, you have the following list of agents: {agents_list}\nThink step by step.\n"
         "Your job is to decompose the user's task into simple steps, each to be executed by a specific agent that you can choose from the agents list.\n"
-        "Once you have the responses from the agents, you need to combine them into a coherent final answer to solve the task.\n\n"
+        "Once you have the responses from the agents, you need to combine them into a coherent final answer to solve the task.\n"
+        "Number the steps and list, for every step, the ids of the steps whose results it needs; steps that need no other result can run right away.\n\n"
         "TASK: {task}\n\n"
         )
-    
+
     def __init__(self, llm, agents, **kwargs):
         self.llm = llm
         self.agents = agents #{agent["name"]: agent for agent in agents}
         self.agents_config = kwargs.get("agents_config", {})
         self.verbose = kwargs.get("verbose", False)
         self.require_approval = kwargs.get("require_approval", False)
-        
-    def decompose_task(self, plan):
-        # This is a placeholder function to decompose the task into steps with dependencies.
-        # It should return a list of lists, where each sublist contains steps that can run in parallel.
+        # maximum number of agent calls in flight at once on the async path
+        self.max_concurrency = kwargs.get("max_concurrency", 8)
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._agent_semaphores = {}
+        # process-wide pool shared by all the orchestrators; `max_concurrency` of an agent in agents.yaml caps its calls in flight
+        self.execution = kwargs.get("execution_service") or get_execution_service()
+        self._agent_configs = {agent["name"]: agent for agent in self.agents_config.get("agents", [])}
+        self.agent_limits = {
+            name: agent["max_concurrency"] for name, agent in self._agent_configs.items() if agent.get("max_concurrency")
+        }
+        self.execution.set_agent_limits(self.agent_limits)
+        # seconds an agent step may take (`timeout` of an agent in agents.yaml overrides it) and a task may take;
+        # steps past their deadline are abandoned and the answer is combined from the results at hand
+        self.step_timeout = kwargs.get("step_timeout")
+        self.task_timeout = kwargs.get("task_timeout")
+        # seconds after which a step still running is duplicated on another agent that has one of its tools, None for no hedging
+        self.hedge_after = kwargs.get("hedge_after")
+        # "groups" runs the decomposed step groups one after the other, "dag" starts each step as soon as its dependencies are done,
+        # "stream" is "dag" with the plan streamed in: each step starts as soon as the planner has written it
+        self.scheduler = kwargs.get("scheduler", "groups")
+        self.last_run_report = None
+        # "single" groups the steps locally from the dependencies given by the planner,
+        # "two_call" asks the LLM to group them (decompose_task); "single" falls back to it when the plan has no dependencies
+        self.planning_mode = kwargs.get("planning_mode", "single")
+        # optional PlanCache: repeated task shapes skip planning and decomposition
+        self.plan_cache = kwargs.get("plan_cache")
+        # "speculative" runs can_stop concurrently with the next step group (cancelled on a stop),
+        # "blocking" waits for can_stop before the next group, "off" runs every group
+        self.early_stopping = kwargs.get("early_stopping", "speculative")
+        # "background" evaluates the answers on a worker thread (sampled, results go to `eval_sink`),
+        # "sync" evaluates before returning (the old behaviour), "off" skips the evaluation
+        self.eval_mode = kwargs.get("eval_mode", "background")
+        self.evaluator = kwargs.get("evaluator")
+        if self.evaluator is None and self.eval_mode == "background":
+            self.evaluator = BackgroundEvaluator(
+                lambda task, response: self.eval_response(task, "orchestrator", task, response),
+                sink=kwargs.get("eval_sink"),
+                sample_rate=kwargs.get("eval_sample_rate", 1.0),
+                max_queue=kwargs.get("eval_max_queue", 100),
+                verbose=self.verbose,
+            )
+        # re-asks for the plan / step groups when the LLM output does not parse or validate
+        self.repair_attempts = kwargs.get("repair_attempts", 2)
+        # optional AgentRouter: tasks one agent can answer alone skip planning, combination and evaluation
+        self.router = kwargs.get("router")
+        # optional AgentIndex: the planning prompt only lists the `planning_top_k` agents most relevant to the task
+        self.agent_index = kwargs.get("agent_index")
+        self.planning_top_k = kwargs.get("planning_top_k", 10)
+        # responses over `combine_budget` tokens are deduplicated and summarized in parallel before the final combine call
+        self.combiner = kwargs.get("combiner") or TokenBudgetCombiner(
+            self.llm, token_budget=kwargs.get("combine_budget", 6000), execution=self.execution, verbose=self.verbose
+        )
+
+    def _complete(self, site, prompt):
+        # every orchestrator LLM call goes through here, tagged with its call site for the LLM wrappers
+        with call_site(site):
+            return self.llm.complete(prompt)
+
+    async def _acomplete(self, site, prompt):
+        with call_site(site):
+            return await self.llm.acomplete(prompt)
+
+    def _complete_structured(self, site, prompt, parse):
+        # `parse(response)` raises ValueError/KeyError/TypeError on malformed output, which is sent back with the error
+        current = prompt
+        for attempt in range(self.repair_attempts + 1):
+            response = self._complete(site, current)
+            try:
+                return parse(response)
+            except (ValueError, KeyError, TypeError) as exc:
+                if attempt == self.repair_attempts:
+                    raise
+                if self.verbose:
+                    print(f"Could not parse the {site} output ({exc}), asking again")
+                current = repair_prompt(prompt, response, exc)
+
+    async def _acomplete_structured(self, site, prompt, parse):
+        current = prompt
+        for attempt in range(self.repair_attempts + 1):
+            response = await self._acomplete(site, current)
+            try:
+                return parse(response)
+            except (ValueError, KeyError, TypeError) as exc:
+                if attempt == self.repair_attempts:
+                    raise
+                if self.verbose:
+                    print(f"Could not parse the {site} output ({exc}), asking again")
+                current = repair_prompt(prompt, response, exc)
+
+    def _decompose_prompt(self, plan):
         response_format = PydanticOutputParser(ParallelSteps)
         prompt = ("Given the User's task:\n\t{task}\n"
                   "and the simple steps, each to be executed by a specific agent:\n\t{steps}\n"
                   "Analyze how to sort the tasks enabling parallel runs and by grouping tasks in a common list.\n")
         prompt = prompt.format(task=plan.goal, steps=plan.steps)
-        response = self.llm.complete(prompt + response_format.format_string)
+        return prompt + response_format.format_string
+
+    def _parse_parallel_steps(self, response):
         if self.verbose:
             print(f"Decomposing the task into steps:\n\t{response}")
-        steps = json.loads(str(response))["steps"]
-        sync_steps = [[step] for step in plan.steps]
+        steps = json.loads(extract_json(response))["steps"]
         parallel_steps = ParallelSteps(steps=steps)
         return parallel_steps.steps
 
-        
-    def generate_plan(self, prompt, task):
-        response_format = PydanticOutputParser(Plan)
-        response = self.llm.complete(prompt + response_format.format_string)
-        steps = json.loads(str(response))["steps"]
+    def decompose_task(self, plan):
+        # This is a placeholder function to decompose the task into steps with dependencies.
+        # It should return a list of lists, where each sublist contains steps that can run in parallel.
+        return self._complete_structured("decompose_task", self._decompose_prompt(plan), self._parse_parallel_steps)
+
+    async def adecompose_task(self, plan):
+        return await self._acomplete_structured("decompose_task", self._decompose_prompt(plan), self._parse_parallel_steps)
+
+    def _parse_plan(self, response, task):
+        steps = json.loads(extract_json(response))["steps"]
         # Validation check
         if not steps:
             raise ValueError("Generated plan is empty")
+        dependencies_known = any("depends_on" in step for step in steps)
         steps  = [Step(**step) for step in steps]
+        unknown = sorted({step.agent for step in steps} - set(self.agents))
+        if unknown:
+            raise ValueError(f"Unknown agents {unknown}, the steps must use one of {sorted(self.agents)}")
+        try:
+            normalize_dependencies(steps)
+        except ValueError as exc:
+            # run a plan with inconsistent dependencies sequentially
+            if self.verbose:
+                print(f"{exc}, running the steps in plan order")
+            for i, step in enumerate(steps):
+                step.depends_on = [steps[i - 1].id] if i else []
         plan = Plan(goal=task, steps=steps)
+        plan._dependencies_known = dependencies_known
         return plan
-    
+
+    def group_steps(self, plan):
+        # Deterministic, local replacement for decompose_task: steps whose dependencies are done run together
+        if self.planning_mode != "single" or not plan._dependencies_known:
+            return None
+        groups = topological_levels(plan.steps)
+        if self.verbose:
+            print(f"Grouped the steps locally into {len(groups)} group(s)")
+        return groups
+
+    def plan_step_groups(self, plan):
+        return self.group_steps(plan) or self.decompose_task(plan)
+
+    async def aplan_step_groups(self, plan):
+        return self.group_steps(plan) or await self.adecompose_task(plan)
+
+    def generate_plan(self, prompt, task):
+        response_format = PydanticOutputParser(Plan)
+        return self._complete_structured(
+            "generate_plan", prompt + response_format.format_string, lambda response: self._parse_plan(response, task)
+        )
+
+    async def agenerate_plan(self, prompt, task):
+        response_format = PydanticOutputParser(Plan)
+        return await self._acomplete_structured(
+            "generate_plan", prompt + response_format.format_string, lambda response: self._parse_plan(response, task)
+        )
+
     def approve_plan(self, plan):
         prompt = (
             "Given the following task from the user: {task}\n"
@@ -84,83 +239,694 @@ class Orchestrator:
         else:
             reason = input("Please provide a reason for disapproving the plan: ")
             return "n", reason
-    
-    def query(self, task):
+
+    def planning_agents(self, task):
+        if self.agent_index is None:
+            return self.agents_config["agents"]
+        return self.agent_index.select(task, self.planning_top_k)
+
+    def planning_prompt(self, task):
         now = datetime.now()
-        agent_list = [(agent["name"], agent["role"]) for agent in self.agents_config["agents"]]
-        prompt = self.system_prompt.format(agents_list=agent_list,task=task, todays_date=now.strftime("%Y-%m-%d"))
-        plan = self.generate_plan(prompt, task)
-        
-        if self.require_approval:
-            approval, reason = self.approve_plan(plan)
-            while approval == "n":
-                pending_approval_prompt = prompt + f"\n\nFAILED LOGIC: {plan.steps}\n\n REASON: {reason}\n\n"
-                plan = self.generate_plan(pending_approval_prompt, task)
+        agent_list = [(agent["name"], agent["role"]) for agent in self.planning_agents(task)]
+        return self.system_prompt.format(agents_list=agent_list,task=task, todays_date=now.strftime("%Y-%m-%d"))
+
+    def _print_plan(self, task, plan):
+        print(f"Received the following task: {task}")
+        print("Steps:")
+        for step in plan.steps:
+            depends_on = f" (after {', '.join(map(str, step.depends_on))})" if step.depends_on else ""
+            print(f"\t{step.id}. {step.agent}: {step.subtask}{depends_on}")
+
+    def _cached_plan(self, task):
+        if self.plan_cache is None:
+            return None, None
+        cached = self.plan_cache.get(task, self.agents_config)
+        if cached is None:
+            return None, None
+        steps, groups = cached
+        plan = Plan(goal=task, steps=[Step(**step) for step in steps])
+        plan._dependencies_known = True
+        if groups is not None:
+            groups = [[Step(**step) for step in group] for group in groups]
+        if self.verbose:
+            print(f"Plan cache hit: {self.plan_cache.stats()}")
+        return plan, groups
+
+    def _cache_plan(self, task, plan, groups):
+        # cached plans were approved when they were first generated
+        if self.plan_cache is not None:
+            groups = [[step.dict() for step in group] for group in groups] if groups is not None else None
+            self.plan_cache.put(task, self.agents_config, [step.dict() for step in plan.steps], groups)
+
+    def run_steps(self, task, on_result=None):
+        # Plans the task and runs the agents; returns their responses. `on_result(step, response)` is called as each step finishes
+        deadline = self._task_deadline()
+        plan, groups = self._cached_plan(task)
+        cached = plan is not None
+        if not cached and self.scheduler == "stream" and not self.require_approval:
+            return self.execute_plan_stream(self.planning_prompt(task), task, on_result=on_result, deadline=deadline)
+        if not cached:
+            prompt = self.planning_prompt(task)
+            plan = self.generate_plan(prompt, task)
+
+            if self.require_approval:
                 approval, reason = self.approve_plan(plan)
-        
+                while approval == "n":
+                    pending_approval_prompt = prompt + f"\n\nFAILED LOGIC: {plan.steps}\n\n REASON: {reason}\n\n"
+                    plan = self.generate_plan(pending_approval_prompt, task)
+                    approval, reason = self.approve_plan(plan)
+
         if self.verbose:
-            print(f"Received the following task: {task}")
-            print("Steps:")
-            for step in plan.steps:
-                print(f"\t{step.agent}: {step.subtask}")
-        responses = []
-        steps = self.decompose_task(plan)  # Decompose the task into a list of lists
+            self._print_plan(task, plan)
+        if self.scheduler in ("dag", "stream"):
+            if not cached:
+                self._cache_plan(task, plan, None)
+            return self.execute_dag(plan, task, on_result=on_result, deadline=deadline)
+        steps = groups or self.plan_step_groups(plan)  # Decompose the task into a list of lists
+        if not cached or groups is None:
+            self._cache_plan(task, plan, steps)
+        return self.run_step_groups(steps, task, on_result=on_result, deadline=deadline)
+
+    async def arun_steps(self, task, on_result=None):
+        # Same as `run_steps`, with every LLM and agent call awaited instead of blocking a thread
+        deadline = self._task_deadline()
+        plan, groups = self._cached_plan(task)
+        cached = plan is not None
+        if not cached and self.scheduler == "stream" and not self.require_approval:
+            return await self.aexecute_plan_stream(self.planning_prompt(task), task, on_result=on_result, deadline=deadline)
+        if not cached:
+            prompt = self.planning_prompt(task)
+            plan = await self.agenerate_plan(prompt, task)
+
+            if self.require_approval:
+                approval, reason = self.approve_plan(plan)
+                while approval == "n":
+                    pending_approval_prompt = prompt + f"\n\nFAILED LOGIC: {plan.steps}\n\n REASON: {reason}\n\n"
+                    plan = await self.agenerate_plan(pending_approval_prompt, task)
+                    approval, reason = self.approve_plan(plan)
+
+        if self.verbose:
+            self._print_plan(task, plan)
+        if self.scheduler in ("dag", "stream"):
+            if not cached:
+                self._cache_plan(task, plan, None)
+            return await self.aexecute_dag(plan, task, on_result=on_result, deadline=deadline)
+        steps = groups or await self.aplan_step_groups(plan)
+        if not cached or groups is None:
+            self._cache_plan(task, plan, steps)
+        return await self.arun_step_groups(steps, task, on_result=on_result, deadline=deadline)
+
+    def _routed_agent(self, agent):
+        if agent is None or agent not in self.agents:
+            return None
+        if self.verbose:
+            print(f"Routing the task straight to {agent}")
+        return agent
+
+    def _routing_failed(self, exc):
+        # e.g. the routing LLM call failed: the task is orchestrated as if no agent had been picked
+        print(f"Routing generated an exception: {exc}, orchestrating the task")
+        self.router.record_fallback()
+
+    def _fast_path_agent(self, task):
+        if self.router is None:
+            return None
+        try:
+            agent = self.router.route(task)
+        except Exception as exc:
+            self._routing_failed(exc)
+            return None
+        return self._routed_agent(agent)
+
+    async def _afast_path_agent(self, task):
+        if self.router is None:
+            return None
+        try:
+            agent = await self.router.aroute(task)
+        except Exception as exc:
+            self._routing_failed(exc)
+            return None
+        return self._routed_agent(agent)
+
+    def _fast_path_failed(self, agent, exc):
+        # the full orchestration gets a second chance at the task
+        print(f"Fast path to {agent} generated an exception: {exc}, orchestrating the task")
+        self.router.record_fallback()
+
+    def _record_route(self, fast, start):
+        if self.router is not None:
+            self.router.record(fast, time.perf_counter() - start)
+
+    def fast_path(self, task):
+        """Answer of the agent the router picks for `task`, None if the task needs the full orchestration."""
+        start = time.perf_counter()
+        agent = self._fast_path_agent(task)
+        if agent is None:
+            return None
+        try:
+            response = self.agents[agent].query(task)
+        except Exception as exc:
+            self._fast_path_failed(agent, exc)
+            return None
+        self._record_route(True, start)
+        if self.verbose:
+            print(f"Agent {agent} responded with: {response}")
+        return response
+
+    async def afast_path(self, task):
+        start = time.perf_counter()
+        agent = await self._afast_path_agent(task)
+        if agent is None:
+            return None
+        try:
+            response = await self.agents[agent].aquery(task)
+        except Exception as exc:
+            self._fast_path_failed(agent, exc)
+            return None
+        self._record_route(True, start)
+        if self.verbose:
+            print(f"Agent {agent} responded with: {response}")
+        return response
+
+    def query(self, task):
+        start = time.perf_counter()
+        response = self.fast_path(task)
+        if response is not None:
+            return response, None
+        all_responses = self.run_steps(task)
+
+        combined_response = self.combine_responses(task, all_responses)
+        self._record_route(False, start)
+        eval_response = self.evaluate(task, combined_response)
+        return combined_response, eval_response
+
+    async def aquery(self, task):
+        start = time.perf_counter()
+        response = await self.afast_path(task)
+        if response is not None:
+            return response, None
+        all_responses = await self.arun_steps(task)
+
+        combined_response = await self.acombine_responses(task, all_responses)
+        self._record_route(False, start)
+        if self.eval_mode == "sync":
+            eval_response = await self.aeval_response(task, "orchestrator", task, combined_response)
+            if self.verbose:
+                print(f"Response evaluation: {eval_response}")
+        else:
+            eval_response = self.evaluate(task, combined_response)
+        return combined_response, eval_response
+
+    def query_stream(self, task):
+        """Generator version of `query`: yields a StreamEvent for each agent result as it finishes ("step"),
+        then the tokens of the combined answer as they arrive ("token") and finally the full answer ("answer")."""
+        start = time.perf_counter()
+        response = self.fast_path(task)
+        if response is not None:
+            yield StreamEvent(kind="token", content=str(response))
+            yield StreamEvent(kind="answer", content=str(response))
+            return
+        events = queue.Queue()
+        outcome = {}
+
+        def run():
+            try:
+                outcome["responses"] = self.run_steps(task, on_result=lambda step, response: events.put(
+                    StreamEvent(kind="step", step=step, content=str(response))))
+            except Exception as exc:
+                outcome["error"] = exc
+            finally:
+                events.put(None)
+
+        threading.Thread(target=run, name="orchestrator-stream", daemon=True).start()
+        while (event := events.get()) is not None:
+            yield event
+        if "error" in outcome:
+            raise outcome["error"]
+
+        text = ""
+        for chunk in self.combine_responses(task, outcome["responses"], stream=True):
+            text += chunk.delta or ""
+            yield StreamEvent(kind="token", content=chunk.delta or "")
+        yield StreamEvent(kind="answer", content=text)
+        self._record_route(False, start)
+        self.evaluate(task, text)
+
+    async def aquery_stream(self, task):
+        # async generator version of `query_stream`
+        start = time.perf_counter()
+        response = await self.afast_path(task)
+        if response is not None:
+            yield StreamEvent(kind="token", content=str(response))
+            yield StreamEvent(kind="answer", content=str(response))
+            return
+        events = asyncio.Queue()
+        steps = asyncio.ensure_future(self.arun_steps(task, on_result=lambda step, response: events.put_nowait(
+            StreamEvent(kind="step", step=step, content=str(response)))))
+        steps.add_done_callback(lambda _: events.put_nowait(None))
+        while (event := await events.get()) is not None:
+            yield event
+        responses = await steps
+
+        text = ""
+        async for chunk in await self.acombine_responses(task, responses, stream=True):
+            text += chunk.delta or ""
+            yield StreamEvent(kind="token", content=chunk.delta or "")
+        yield StreamEvent(kind="answer", content=text)
+        self._record_route(False, start)
+        if self.eval_mode == "sync":
+            await self.aeval_response(task, "orchestrator", task, text)
+        else:
+            self.evaluate(task, text)
+
+    def _should_check_stop(self, index, groups):
+        # local pre-check: after the last group the plan is exhausted, there is nothing left to stop
+        return self.early_stopping != "off" and index < len(groups) - 1
+
+    def _speculative_can_stop(self, task, responses):
+        # a failed stop check must not fail the run, it just doesn't stop it
+        try:
+            return self.can_stop(task, responses)
+        except Exception as exc:
+            if self.verbose:
+                print(f"can_stop generated an exception: {exc}")
+            return False
+
+    async def _aspeculative_can_stop(self, task, responses):
+        try:
+            return await self.acan_stop(task, responses)
+        except Exception as exc:
+            if self.verbose:
+                print(f"can_stop generated an exception: {exc}")
+            return False
+
+    def _task_deadline(self):
+        return time.perf_counter() + self.task_timeout if self.task_timeout is not None else None
+
+    def _step_timeout(self, step):
+        return self._agent_configs.get(step.agent, {}).get("timeout", self.step_timeout)
+
+    def _step_deadline(self, step, deadline):
+        timeout = self._step_timeout(step)
+        return earliest(time.perf_counter() + timeout if timeout is not None else None, deadline)
+
+    def _skip_groups(self, groups):
+        # notes for the steps that never started because the task ran out of time
+        exc = TimeoutError("task deadline reached before the step started")
+        return [self._step_failed(step, exc) for group in groups for step in group]
+
+    def _agent_tools(self, name):
+        tools = self._agent_configs.get(name, {}).get("tools", [])
+        return {tools} if isinstance(tools, str) else set(tools)
+
+    def _hedge_agent(self, step):
+        # another agent able to do the step: it has every tool of the step's agent (agents without
+        # tools answer from their own role prompt and are not hedged). None in the shipped agents.yaml
+        # qualifies: hedging needs two agents with the same tools, e.g. a second trader
+        tools = self._agent_tools(step.agent)
+        if not tools:
+            return None
+        for name in self._agent_configs:
+            if name != step.agent and name in self.agents and tools <= self._agent_tools(name):
+                return name
+        return None
+
+    def _submit_step(self, step, call):
+        # `call(step)` runs the step on the shared pool; a slow step may be duplicated on another agent (hedging)
+        primary = self.execution.submit(call, step, key=step.agent)
+        backup_agent = self._hedge_agent(step) if self.hedge_after is not None else None
+        if backup_agent is None:
+            return primary
+        backup = step.copy(update={"agent": backup_agent})
+        return hedge(primary, lambda: self.execution.submit(call, backup, key=backup_agent), self.hedge_after)
+
+    async def _ahedged(self, step, call):
+        # async counterpart of `_submit_step`: `call(step)` returns a coroutine
+        backup_agent = self._hedge_agent(step) if self.hedge_after is not None else None
+        if backup_agent is None:
+            return await call(step)
+        attempts = {asyncio.ensure_future(call(step))}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+            if not done:
+                attempts.add(asyncio.ensure_future(call(step.copy(update={"agent": backup_agent}))))
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def run_step_groups(self, groups, task, on_result=None, deadline=None):
         all_responses = []
+        stop = None  # pending speculative can_stop of the previous group
+        for index, step_group in enumerate(groups):
+            if deadline is not None and time.perf_counter() >= deadline:
+                all_responses.extend(self._skip_groups(groups[index:]))
+                break
+            responses = self.execute_parallel_steps(step_group, task, stop=stop, on_result=on_result, deadline=deadline)
+            if responses is None:
+                if self.verbose:
+                    print(f"Stopping early, cancelled step group {index + 1} of {len(groups)}")
+                break
+            all_responses.extend(responses)
+            if stop is not None and stop.result():
+                break
+            stop = None
+            if self._should_check_stop(index, groups):
+                if self.early_stopping == "speculative":
+                    stop = self.execution.submit(self._speculative_can_stop, task, responses, key="orchestrator")
+                elif self.can_stop(task, responses):
+                    break
+        return all_responses
 
-        for step_group in steps:
-            responses = self.execute_parallel_steps(step_group, task)
+    async def arun_step_groups(self, groups, task, on_result=None, deadline=None):
+        all_responses = []
+        stop = None
+        for index, step_group in enumerate(groups):
+            if deadline is not None and time.perf_counter() >= deadline:
+                all_responses.extend(self._skip_groups(groups[index:]))
+                break
+            group = asyncio.ensure_future(self.aexecute_parallel_steps(step_group, task, on_result=on_result, deadline=deadline))
+            if stop is not None:
+                await asyncio.wait({stop, group}, return_when=asyncio.FIRST_COMPLETED)
+                if stop.done() and stop.result():
+                    group.cancel()
+                    if self.verbose:
+                        print(f"Stopping early, cancelled step group {index + 1} of {len(groups)}")
+                    break
+            responses = await group
             all_responses.extend(responses)
-            if (self.can_stop(task, responses)):
+            if stop is not None and await stop:
                 break
-        
-        combined_response = self.combine_responses(task, all_responses)
-        eval_response = self.eval_response(task, "orchestrator", task, combined_response)
-        
-        if self.verbose:
-            print(f"Response evaluation: {eval_response}")
-        
-        return combined_response, eval_response
+            stop = None
+            if self._should_check_stop(index, groups):
+                if self.early_stopping == "speculative":
+                    stop = asyncio.ensure_future(self._aspeculative_can_stop(task, responses))
+                elif await self.acan_stop(task, responses):
+                    break
+        return all_responses
 
-    def execute_parallel_steps(self, step_group, task):
+    def execute_parallel_steps(self, step_group, task, stop=None, on_result=None, deadline=None):
+        # `stop` is a future of a speculative can_stop; if it answers yes, the group is cancelled and None returned.
+        # `deadline` (time.perf_counter()) bounds the whole task, steps past their deadline are abandoned
         responses = []
-        with ThreadPoolExecutor() as executor:
-            future_to_step = {executor.submit(self.query_agent, step): step for step in step_group}
-            for future in as_completed(future_to_step):
+        started = time.perf_counter()
+        future_to_step = {self._submit_step(step, self.query_agent): step for step in step_group}
+        step_deadlines = {future: self._step_deadline(step, deadline) for future, step in future_to_step.items()}
+        pending = set(future_to_step)
+        while pending:
+            watched = pending | {stop} if stop is not None else pending
+            timeout = time_left(earliest(*(step_deadlines[future] for future in pending)))
+            done, _ = wait(watched, timeout=timeout, return_when=FIRST_COMPLETED)
+            if stop is not None and stop in done:
+                if stop.result():
+                    # steps already running finish in the background, the queued ones never start
+                    for future in pending:
+                        future.cancel()
+                    return None
+                stop = None
+            for future in done & pending:
+                pending.discard(future)
                 step = future_to_step[future]
                 try:
                     response = future.result()
                     if self.verbose:
                         print(f"Step {step} responded with: {response}")
-                    responses.append(response)
+                    if on_result is not None:
+                        on_result(step, response)
                 except Exception as exc:
-                    if self.verbose:
-                        print(f"Step {step} generated an exception: {exc}")
+                    response = self._step_failed(step, exc)
+                responses.append(response)
+            now = time.perf_counter()
+            for future in list(pending):
+                if step_deadlines[future] is not None and now >= step_deadlines[future]:
+                    # a running thread cannot be killed: the straggler is abandoned and its result ignored
+                    pending.discard(future)
+                    future.cancel()
+                    responses.append(self._step_failed(future_to_step[future], TimeoutError(f"no response after {now - started:.1f}s")))
         return responses
 
-    def query_agent(self, step):
-        agent_name, agent_query = step.agent, step.subtask
-        agent_prompt = (f"Given the User's task and the query from the orchestrator: {agent_query}\n"
-                        "Please provide a response to the query:{agent_query}")
-        return self.agents[agent_name].query(agent_prompt)
+    def _step_failed(self, step, exc):
+        # failed steps are reported and kept as a note, so the final answer does not silently miss them
+        print(f"Step {step} generated an exception: {exc}")
+        return failure_note(step, exc)
+
+    def _report_run(self, report):
+        self.last_run_report = report
+        if self.verbose:
+            print(report.format())
+        return report.responses()
+
+    def _dag_executor(self, on_result):
+        return DagExecutor(
+            lambda step, upstream: self.query_agent(step, upstream),
+            verbose=self.verbose,
+            on_result=on_result,
+            submit=lambda fn, step, *args: self._submit_step(step, lambda s: fn(s, *args)),
+            timeout=self._step_timeout,
+        )
+
+    def _adag_executor(self, on_result):
+        return DagExecutor(
+            lambda step, upstream: self._ahedged(step, lambda s: self._acapped_query_agent(s, upstream)),
+            verbose=self.verbose,
+            on_result=on_result,
+            timeout=self._step_timeout,
+        )
+
+    def execute_dag(self, plan, task, on_result=None, deadline=None):
+        return self._report_run(self._dag_executor(on_result).run(plan.steps, deadline=deadline))
+
+    async def aexecute_dag(self, plan, task, on_result=None, deadline=None):
+        executor = self._adag_executor(on_result)
+        return self._report_run(await executor.arun(plan.steps, semaphore=self._get_semaphore(), deadline=deadline))
 
-    def combine_responses(self, original_query, responses):
-        system_prompt = (
+    def _streamed_step(self, data, plan):
+        # streamed steps are checked like the steps of `_parse_plan`; the ids are renumbered by the executor
+        try:
+            step = Step(**data)
+            if step.agent not in self.agents:
+                raise ValueError(f"unknown agent, the steps must use one of {sorted(self.agents)}")
+        except (ValueError, TypeError) as exc:
+            print(f"Skipping an invalid step of the streamed plan {data}: {exc}")
+            plan._skipped_steps += 1
+            return None
+        return step
+
+    def _unfed_steps(self, fed_ids, steps):
+        # steps of a regenerated plan that the streamed plan did not already start: matched by the ids
+        # the planner gave them, by position when it gave none or numbered them from 0
+        if fed_ids and 0 not in fed_ids:
+            return [step for step in steps if step.id not in fed_ids]
+        return steps[len(fed_ids):]
+
+    def _stream_failed(self, exc):
+        if exc is not None:
+            print(f"Streaming the plan generated an exception: {exc}, planning the remaining steps again")
+        elif self.verbose:
+            print("The streamed plan had no valid step, planning again")
+
+    def _stream_plan(self, prompt, task, feed):
+        # planner side of `execute_plan_stream`: parses the streamed plan and feeds its steps to the executor
+        plan = Plan(goal=task, steps=[])
+        fed_ids = []
+        try:
+            error = None
+            try:
+                parser = PlanStreamParser()
+                with call_site("generate_plan"):
+                    stream = self.llm.stream_complete(prompt + PydanticOutputParser(Plan).format_string)
+                for chunk in stream:
+                    for data in parser.feed(chunk.delta or ""):
+                        step = self._streamed_step(data, plan)
+                        if step is not None:
+                            plan.steps.append(step)
+                            fed_ids.append(step.id)
+                            feed.put(step)
+            except Exception as exc:
+                error = exc
+            if error is not None or not plan.steps:
+                # the stream failed or nothing usable was streamed: plan with the regular call and its
+                # repair re-asks, the steps already started are not fed twice
+                self._stream_failed(error)
+                for step in self._unfed_steps(fed_ids, self.generate_plan(prompt, task).steps):
+                    plan.steps.append(step)
+                    feed.put(step)
+        finally:
+            feed.close()
+        return plan
+
+    def _finish_plan_stream(self, task, plan):
+        plan._dependencies_known = True
+        if self.verbose:
+            self._print_plan(task, plan)
+        if not plan._skipped_steps:
+            self._cache_plan(task, plan, None)
+
+    def execute_plan_stream(self, prompt, task, on_result=None, deadline=None):
+        # generates the plan with stream_complete and starts every step as soon as the planner has written it
+        feed = StepFeed()
+        planner = self.execution.submit(self._stream_plan, prompt, task, feed, key="orchestrator")
+        report = self._dag_executor(on_result).run([], deadline=deadline, feed=feed)
+        self._finish_plan_stream(task, planner.result())
+        return self._report_run(report)
+
+    async def _astream_plan(self, prompt, task, plan):
+        # async generator of the steps of the streamed plan; `plan` collects them
+        fed_ids = []
+        error = None
+        try:
+            parser = PlanStreamParser()
+            with call_site("generate_plan"):
+                stream = await self.llm.astream_complete(prompt + PydanticOutputParser(Plan).format_string)
+            async for chunk in stream:
+                for data in parser.feed(chunk.delta or ""):
+                    step = self._streamed_step(data, plan)
+                    if step is not None:
+                        plan.steps.append(step)
+                        fed_ids.append(step.id)
+                        yield step
+        except Exception as exc:
+            error = exc
+        if error is not None or not plan.steps:
+            self._stream_failed(error)
+            for step in self._unfed_steps(fed_ids, (await self.agenerate_plan(prompt, task)).steps):
+                plan.steps.append(step)
+                yield step
+
+    async def aexecute_plan_stream(self, prompt, task, on_result=None, deadline=None):
+        plan = Plan(goal=task, steps=[])
+        executor = self._adag_executor(on_result)
+        source = self._astream_plan(prompt, task, plan)
+        report = await executor.arun([], semaphore=self._get_semaphore(), deadline=deadline, source=source)
+        self._finish_plan_stream(task, plan)
+        return self._report_run(report)
+
+    def _get_semaphore(self):
+        # asyncio primitives are bound to one event loop, a new loop (e.g. a new asyncio.run) gets a new semaphore
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._agent_semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.agent_limits.items()}
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _acapped_query_agent(self, step, upstream=None):
+        # per-agent concurrency cap of the async path, the counterpart of the ExecutionService keys
+        semaphore = self._agent_semaphores.get(step.agent)
+        if semaphore is None:
+            return await self.aquery_agent(step, upstream)
+        async with semaphore:
+            return await self.aquery_agent(step, upstream)
+
+    async def aexecute_parallel_steps(self, step_group, task, on_result=None, deadline=None):
+        semaphore = self._get_semaphore()
+
+        async def run(step):
+            step_deadline = self._step_deadline(step, deadline)
+            started = time.perf_counter()
+            async with semaphore:
+                try:
+                    response = await asyncio.wait_for(self._ahedged(step, self._acapped_query_agent), time_left(step_deadline))
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"no response after {time.perf_counter() - started:.1f}s")
+            if self.verbose:
+                print(f"Step {step} responded with: {response}")
+            if on_result is not None:
+                on_result(step, response)
+            return response
+
+        results = await asyncio.gather(*(run(step) for step in step_group), return_exceptions=True)
+        responses = []
+        for step, result in zip(step_group, results):
+            if isinstance(result, Exception):
+                result = self._step_failed(step, result)
+            responses.append(result)
+        return responses
+
+    def _agent_prompt(self, step, upstream=None):
+        agent_query = step.subtask
+        prompt = (f"Given the User's task and the query from the orchestrator: {agent_query}\n"
+                  f"Please provide a response to the query:{agent_query}")
+        if upstream:
+            # outputs of the steps this one depends on
+            results = "\n".join(
+                f"[step {dep} - {record.step.agent}]: {record.response if record.error is None else 'ERROR: ' + str(record.error)}"
+                for dep, record in sorted(upstream.items())
+            )
+            prompt += f"\n\nResults of the previous steps:\n{results}"
+        return prompt
+
+    def query_agent(self, step, upstream=None):
+        return self.agents[step.agent].query(self._agent_prompt(step, upstream))
+
+    async def aquery_agent(self, step, upstream=None):
+        return await self.agents[step.agent].aquery(self._agent_prompt(step, upstream))
+
+    def _combine_prompt(self, original_query, responses):
+        listed = "\n\n".join(f"[{i}] {response}" for i, response in enumerate(responses, start=1))
+        prompt = (
             f"Given the following original query from the user:\n{original_query}\n\n"
-            f"And the following responses from agents:\n{responses}\n\n"
+            f"And the following responses from agents:\n{listed}\n\n"
             "Please combine these responses into a coherent final answer."
         )
-        combined_response = self.llm.complete(system_prompt)
+        if is_partial(responses):
+            prompt += ("\nSome agents failed or did not finish in time (their responses are notes in square brackets): "
+                       "answer with the results available and say which parts of the answer are missing or partial.")
+        return prompt
+
+    def combine_responses(self, original_query, responses, stream=False):
+        # with `stream`, returns the generator of stream_complete (CompletionResponse chunks with a `delta`)
+        responses = self.combiner.reduce(original_query, responses)
+        if stream:
+            with call_site("combine_responses"):
+                return self.llm.stream_complete(self._combine_prompt(original_query, responses))
+        combined_response = self._complete("combine_responses", self._combine_prompt(original_query, responses))
         return combined_response
 
-    def eval_response(self, task, agent_name, query, response):
-        system_prompt = (
+    async def acombine_responses(self, original_query, responses, stream=False):
+        responses = await self.combiner.areduce(original_query, responses)
+        if stream:
+            with call_site("combine_responses"):
+                return await self.llm.astream_complete(self._combine_prompt(original_query, responses))
+        return await self._acomplete("combine_responses", self._combine_prompt(original_query, responses))
+
+    def _eval_prompt(self, task, agent_name, query, response):
+        return (
             f"Given the following question from the user:\n{task}\n\n"
             f"The response from {agent_name} to the query {query} is:\n{response}\n\n"
             "Please evaluate the response in the following format: 'has_error: new_question: explanation'"
         )
-        return self.llm.complete(system_prompt)
-    
-    def can_stop(self, task, responses):
+
+    def evaluate(self, task, combined_response):
+        # Returns the evaluation in "sync" mode; in "background" mode the answer is queued and None is returned
+        if self.eval_mode == "sync":
+            eval_response = self.eval_response(task, "orchestrator", task, combined_response)
+            if self.verbose:
+                print(f"Response evaluation: {eval_response}")
+            return eval_response
+        if self.eval_mode == "background" and self.evaluator is not None:
+            self.evaluator.submit(task, combined_response)
+        return None
+
+    def close(self):
+        # waits for the pending background evaluations
+        if self.evaluator is not None:
+            self.evaluator.close()
+
+    def eval_response(self, task, agent_name, query, response):
+        return self._complete("eval_response", self._eval_prompt(task, agent_name, query, response))
+
+    async def aeval_response(self, task, agent_name, query, response):
+        return await self._acomplete("eval_response", self._eval_prompt(task, agent_name, query, response))
+
+    def _can_stop_prompt(self, task, responses):
         # Generic logic to determine if the orchestrator can stop querying agents based on the responses so far
         prompt = (
             "Given the following task from the user: {task}\n"
@@ -168,9 +934,14 @@ class Orchestrator:
             "Please determine if the orchestrator can stop querying agents.\n"
             "ANSWER: Yes/No"
         )
-        response = self.llm.complete(prompt.format(task=task, responses=responses))
+        return prompt.format(task=task, responses=responses)
+
+    def can_stop(self, task, responses):
+        response = self._complete("can_stop", self._can_stop_prompt(task, responses))
         if "Yes" in str(response):
             return True
         return False
-    
-    
\ No newline at end of file
+
+    async def acan_stop(self, task, responses):
+        response = await self._acomplete("can_stop", self._can_stop_prompt(task, responses))
+        return "Yes" in str(response)
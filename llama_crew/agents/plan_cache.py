@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Parameter slots of a task: quoted strings, numbers and upper case symbols (tickers, currency codes, pairs)
+SLOT_RE = re.compile(r'"([^"]+)"|\'([^\']+)\'|(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])|\b([A-Z][A-Z0-9]+(?:[=\-/.][A-Z0-9]+)*)\b')
+
+
+def normalize_task(task, slots=True):
+    """Returns the signature of a task and the values of its parameter slots.
+
+    With ``slots``, "price of BTC in EUR" and "price of ETH in USD" share the signature
+    "price of <slot0> in <slot1>".
+    """
+    values = []
+    if slots:
+        def replace(match):
+            values.append(next(group for group in match.groups() if group is not None))
+            return f"<slot{len(values) - 1}>"
+        task = SLOT_RE.sub(replace, task)
+    signature = " ".join(task.lower().split()).rstrip("?.! ")
+    return signature, values
+
+
+def agents_hash(agents_config):
+    return hashlib.sha256(json.dumps(agents_config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _slot_pattern(value):
+    return re.compile(rf"(?<!\w){re.escape(value)}(?!\w)")
+
+
+class PlanCache:
+    """Cache of plans (and their step groups) keyed by the normalized task signature and the agent roster.
+
+    Plans are stored with the slot values of the task replaced by placeholders, so a hit for a task
+    with different parameters gets the plan filled in with its own values.
+
+    Args:
+        max_size (int): number of plans kept in memory (least recently used are evicted).
+        ttl (float): seconds a plan stays valid, None for no expiry.
+        persist_dir (str): directory of the on-disk backend, None to keep the cache in memory only.
+        slots (bool): whether to substitute parameter slots.
+    """
+
+    def __init__(self, max_size=256, ttl=24 * 3600, persist_dir=None, slots=True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_dir = persist_dir
+        self.slots = slots
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def _key(self, signature, agents_config):
+        return hashlib.sha256(f"{signature}|{agents_hash(agents_config)}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.json")
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+
+    def _load(self, key):
+        entry = self._entries.get(key)
+        if entry is None and self.persist_dir and os.path.exists(self._path(key)):
+            with open(self._path(key), "r") as file:
+                entry = json.load(file)
+        if entry is not None and self._expired(entry):
+            self._evict(key)
+            return None
+        return entry
+
+    def _evict(self, key):
+        self._entries.pop(key, None)
+        if self.persist_dir and os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def _map_subtasks(self, steps, groups, fn):
+        steps = [dict(step, subtask=fn(step["subtask"])) for step in steps]
+        if groups is not None:
+            groups = [[dict(step, subtask=fn(step["subtask"])) for step in group] for group in groups]
+        return steps, groups
+
+    def get(self, task, agents_config):
+        """Returns ``(steps, groups)`` for a cached task shape, or None.
+
+        ``steps`` is a list of step dicts and ``groups`` a list of lists of step dicts (or None).
+        """
+        signature, values = normalize_task(task, self.slots)
+        key = self._key(signature, agents_config)
+        with self._lock:
+            entry = self._load(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+        def filler(slot_values):
+            def fill(subtask):
+                for i, value in enumerate(slot_values):
+                    subtask = subtask.replace(f"<slot{i}>", value)
+                return subtask
+            return fill
+        plan = self._map_subtasks(entry["steps"], entry["groups"], filler(values))
+        # entries saved without their values are compared with the template itself
+        cached_values = entry.get("values")
+        cached_plan = self._map_subtasks(entry["steps"], entry["groups"], filler(cached_values or []))
+        if values and values != cached_values and plan == cached_plan:
+            # the parameters differ but the plan does not use them: it is the plan of another task
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return plan
+
+    def put(self, task, agents_config, steps, groups=None):
+        """Caches the plan of ``task``; returns False when it cannot be reused for other slot values."""
+        signature, values = normalize_task(task, self.slots)
+        key = self._key(signature, agents_config)
+        if len(set(values)) != len(values):
+            # a repeated value ("2 plus 2") cannot tell which slot each occurrence in the plan belongs to
+            return False
+
+        def template(subtask):
+            for i, value in enumerate(values):
+                subtask = _slot_pattern(value).sub(f"<slot{i}>", subtask)
+            return subtask
+        steps, groups = self._map_subtasks(steps, groups, template)
+        templated = " ".join(step["subtask"] for step in steps)
+        if any(f"<slot{i}>" not in templated for i in range(len(values))):
+            # the plan spells a parameter differently ("BTC" as "Bitcoin"): filled in, it would keep the old value
+            return False
+        entry = {"signature": signature, "values": values, "steps": steps, "groups": groups, "created": time.time()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            if self.persist_dir:
+                tmp_path = self._path(key) + ".tmp"
+                with open(tmp_path, "w") as file:
+                    json.dump(entry, file)
+                os.replace(tmp_path, self._path(key))
+        return True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
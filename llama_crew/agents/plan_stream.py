@@ -0,0 +1,67 @@
+import json
+
+
+class PlanStreamParser:
+    """Incremental parser of a streamed ``Plan`` JSON: returns each object of the top-level ``steps``
+    array as soon as its closing brace arrives, without waiting for the rest of the plan.
+
+    Text before the first ``{`` (prose, a markdown fence) is skipped.
+    """
+
+    def __init__(self, key="steps"):
+        self.key = key
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._last_string = None
+        self._array_depth = None  # depth of the objects of the steps array, once it is open
+        self._start = None  # buffer index where the current step object starts
+
+    def feed(self, text):
+        """Consumes the next chunk of the planner output; returns the step dicts completed by it."""
+        steps = []
+        for char in text:
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._string)
+                else:
+                    self._string.append(char)
+                continue
+            if char == '"' and self._depth > 0:
+                self._in_string = True
+                self._string = []
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._last_string == self.key:
+                    self._array_depth = self._depth + 1
+                elif char == "{" and self._depth == self._array_depth:
+                    self._start = len(self._buffer) - 1
+            elif char in "}]":
+                if char == "}" and self._depth == self._array_depth and self._start is not None:
+                    step = self._parse("".join(self._buffer[self._start:]))
+                    if step is not None:
+                        steps.append(step)
+                    self._start = None
+                if char == "]" and self._depth + 1 == self._array_depth:
+                    self._array_depth = None
+                self._depth = max(0, self._depth - 1)
+        return steps
+
+    def _parse(self, text):
+        try:
+            step = json.loads(text)
+        except ValueError:
+            return None
+        return step if isinstance(step, dict) else None
+
+    @property
+    def text(self):
+        return "".join(self._buffer)
@@ -0,0 +1,126 @@
+import re
+import threading
+
+from llama_crew.llms import call_site
+from llama_crew.retrieval import tokenize
+from .agent_index import AgentIndex
+
+# markers of a task that needs several steps or agents (sequencing, comparisons, several questions)
+COMPOUND_RE = re.compile(r"\b(and then|then|after that|compare|versus|vs|both|each|step by step)\b|;|\?.+\?", re.IGNORECASE)
+# arithmetic operators between numbers, spelled out so that "2+3" matches the agent with the `add` tool
+OPERATOR_RE = re.compile(r"(?<=\d)\s*([-+*/x])\s*(?=\d)")
+OPERATORS = {"+": " add ", "-": " subtract ", "*": " multiply ", "x": " multiply ", "/": " divide "}
+
+
+def spell_operators(task):
+    return OPERATOR_RE.sub(lambda match: OPERATORS[match.group(1)], task)
+
+
+
+class AgentRouter:
+    """Sends tasks that one agent can answer alone straight to that agent, skipping the orchestration.
+
+    Args:
+        agents_config (dict): the agents.yaml configuration.
+        tools (list): the Tool objects of tools.yaml; their descriptions are indexed with their agents.
+        index (AgentIndex): an existing index of the agents, e.g. the one used for planning.
+        mode (str): "bm25" scores the task against the name, role, prompt and tools of every agent
+            locally; "llm" asks ``llm`` once which agent, if any, can answer alone.
+        min_score (float): BM25 score the best agent needs to get the task.
+        margin (float): how many times better than the runner-up the best agent must score.
+        max_words (int): longer tasks are always orchestrated.
+    """
+
+    route_prompt = (
+        "You route user tasks to agents. Agents:\n{agents}\n\n"
+        "TASK: {task}\n\n"
+        "If a single agent can fully answer the task on its own, answer with its name only. "
+        "If the task needs several steps or agents, answer MULTI."
+    )
+
+    def __init__(self, agents_config, tools=None, mode="bm25", llm=None, min_score=1.0, margin=1.5, max_words=40, index=None):
+        self.agents = [agent for agent in agents_config["agents"]]
+        self.mode = mode
+        self.llm = llm
+        self.min_score = min_score
+        self.margin = margin
+        self.max_words = max_words
+        self.index = index or AgentIndex(agents_config, tools)
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.orchestrated = 0
+        self.fallbacks = 0
+        self._fast_time = 0.0
+        self._orchestrated_time = 0.0
+
+    def is_compound(self, task):
+        return len(tokenize(task)) > self.max_words or bool(COMPOUND_RE.search(task))
+
+    def _bm25_route(self, task):
+        ranked = self.index.ranked(spell_operators(task), 2)
+        if not ranked or ranked[0][1] < self.min_score:
+            return None
+        if len(ranked) > 1 and ranked[0][1] < self.margin * ranked[1][1]:
+            return None
+        return ranked[0][0]["name"]
+
+    def _llm_route_prompt(self, task):
+        agents = "\n".join(f"- {agent['name']}: {agent.get('role', '')}" for agent in self.index.select(task, 10))
+        return self.route_prompt.format(agents=agents, task=task)
+
+    def _agent_name(self, answer):
+        answer = str(answer).strip()
+        return answer if answer in {agent["name"] for agent in self.agents} else None
+
+    def _llm_route(self, task):
+        with call_site("route"):
+            return self._agent_name(self.llm.complete(self._llm_route_prompt(task)))
+
+    async def _allm_route(self, task):
+        with call_site("route"):
+            return self._agent_name(await self.llm.acomplete(self._llm_route_prompt(task)))
+
+    def route(self, task):
+        """Name of the agent that should answer ``task`` alone, None to orchestrate it."""
+        if self.is_compound(task):
+            return None
+        if self.mode == "llm" and self.llm is not None:
+            return self._llm_route(task)
+        return self._bm25_route(task)
+
+    async def aroute(self, task):
+        """Async ``route``: the "llm" mode does not block the event loop."""
+        if self.is_compound(task):
+            return None
+        if self.mode == "llm" and self.llm is not None:
+            return await self._allm_route(task)
+        return self._bm25_route(task)
+
+    def record(self, fast, latency):
+        with self._lock:
+            if fast:
+                self.fast_path += 1
+                self._fast_time += latency
+            else:
+                self.orchestrated += 1
+                self._orchestrated_time += latency
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.fast_path + self.orchestrated
+            avg_fast = self._fast_time / self.fast_path if self.fast_path else 0.0
+            avg_orchestrated = self._orchestrated_time / self.orchestrated if self.orchestrated else None
+            return {
+                "fast_path": self.fast_path,
+                "orchestrated": self.orchestrated,
+                "fallbacks": self.fallbacks,
+                "fast_path_rate": self.fast_path / total if total else 0.0,
+                "avg_fast_latency": avg_fast,
+                "avg_orchestrated_latency": avg_orchestrated,
+                # estimated against the orchestrated tasks of this process, None until there is one
+                "latency_saved": (avg_orchestrated - avg_fast) * self.fast_path if avg_orchestrated is not None else None,
+            }
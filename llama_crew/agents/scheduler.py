@@ -0,0 +1,398 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def normalize_dependencies(steps):
+    """Gives every step a unique id and drops dependencies on unknown steps or on the step itself.
+
+    Planners often omit ids or number them from 0; the steps are then renumbered 1..n in plan
+    order and their dependencies are renumbered with them. With repeated ids a dependency cannot
+    tell which step it means: the steps run in plan order, each depending on the previous one.
+
+    Raises:
+        ValueError: if the dependencies contain a cycle.
+    """
+    ids = [step.id for step in steps]
+    if len(set(ids)) != len(ids):
+        has_dependencies = any(step.depends_on for step in steps)
+        for i, step in enumerate(steps, start=1):
+            step.id = i
+            step.depends_on = [i - 1] if has_dependencies and i > 1 else []
+    elif any(i <= 0 for i in ids):
+        renumbered = {step.id: i for i, step in enumerate(steps, start=1)}
+        for step in steps:
+            step.id = renumbered[step.id]
+            step.depends_on = [renumbered[dep] for dep in step.depends_on if dep in renumbered]
+    known = {step.id for step in steps}
+    for step in steps:
+        step.depends_on = sorted({dep for dep in step.depends_on if dep in known and dep != step.id})
+    topological_levels(steps)
+    return steps
+
+
+class MissingResult(str):
+    """Note standing in for the response of a step that failed or did not finish before its deadline."""
+
+
+def failure_note(step, error):
+    """Stands in for the response of a failed step, so the combiner knows a part of the task is missing."""
+    if isinstance(error, TimeoutError):
+        return MissingResult(f"[{step.agent} did not finish '{step.subtask}' in time: {error}]")
+    return MissingResult(f"[{step.agent} could not complete '{step.subtask}': {type(error).__name__}: {error}]")
+
+
+def is_partial(responses):
+    return any(isinstance(response, MissingResult) for response in responses)
+
+
+def earliest(*deadlines):
+    """The earliest of the given ``time.perf_counter()`` deadlines, None if there is none."""
+    deadlines = [deadline for deadline in deadlines if deadline is not None]
+    return min(deadlines) if deadlines else None
+
+
+def time_left(deadline):
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.perf_counter())
+
+
+def topological_levels(steps):
+    """Groups the steps in levels: every step only depends on steps of earlier levels.
+
+    Raises:
+        ValueError: if the dependencies contain a cycle.
+    """
+    remaining = {step.id: step for step in steps}
+    done = set()
+    levels = []
+    while remaining:
+        level = [step for step in remaining.values() if all(dep in done for dep in step.depends_on)]
+        if not level:
+            raise ValueError(f"Plan has cyclic dependencies between steps {sorted(remaining)}")
+        levels.append(level)
+        for step in level:
+            done.add(step.id)
+            del remaining[step.id]
+    return levels
+
+
+def unresolvable(steps):
+    """Ids of the steps that can never start: they are on a dependency cycle or depend on one."""
+    try:
+        topological_levels(steps)
+    except ValueError:
+        remaining = {step.id: step for step in steps}
+        done = set()
+        progress = True
+        while progress:
+            ready = [step for step in remaining.values() if all(dep in done for dep in step.depends_on)]
+            progress = bool(ready)
+            for step in ready:
+                done.add(step.id)
+                del remaining[step.id]
+        return set(remaining)
+    return set()
+
+
+class StepFeed:
+    """Thread-safe queue of the steps of a plan that is still being generated.
+
+    The producer calls ``put(step)`` for each step and ``close()`` at the end of the plan; the
+    executor waits on ``signal``, a future done whenever there is something new to ``take()``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = []
+        self._closed = False
+        self.signal = Future()
+
+    def _notify(self):
+        if not self.signal.done():
+            self.signal.set_result(None)
+
+    def put(self, step):
+        with self._lock:
+            self._steps.append(step)
+            self._notify()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._notify()
+
+    def take(self):
+        """Returns the steps received since the last call and whether the plan is complete."""
+        with self._lock:
+            steps, self._steps = self._steps, []
+            if not self._closed:
+                self.signal = Future()
+            return steps, self._closed
+
+
+class StepRecord:
+    def __init__(self, step):
+        self.step = step
+        self.start = None
+        self.end = None
+        self.response = None
+        self.error = None
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+class RunReport:
+    """Timings of a DAG run and its critical path, the chain of dependent steps that set the run's latency."""
+
+    def __init__(self, records, start, end):
+        self.records = records
+        self.start = start
+        self.end = end
+        self.critical_path = self._critical_path()
+
+    def _critical_path(self):
+        finished = [record for record in self.records.values() if record.end is not None]
+        if not finished:
+            return []
+        # walk back from the step that finished last through the dependency that finished last
+        # (steps that never started, e.g. on a dependency cycle, only end the path if nothing ran)
+        record = max(finished, key=lambda r: (r.duration > 0, r.end))
+        path = [record]
+        while True:
+            # steps failed on a dependency cycle have "finished" dependencies that are not on the path
+            deps = [
+                self.records[dep] for dep in record.step.depends_on
+                if dep in self.records and self.records[dep].end is not None and self.records[dep] not in path
+            ]
+            if not deps:
+                break
+            record = max(deps, key=lambda r: r.end)
+            path.append(record)
+        return list(reversed(path))
+
+    @property
+    def wall_time(self):
+        return self.end - self.start
+
+    @property
+    def critical_path_time(self):
+        return sum(record.duration for record in self.critical_path)
+
+    @property
+    def total_step_time(self):
+        return sum(record.duration for record in self.records.values())
+
+    def responses(self):
+        return [
+            record.response if record.error is None else failure_note(record.step, record.error)
+            for _, record in sorted(self.records.items())
+            if record.end is not None
+        ]
+
+    def format(self):
+        path = " -> ".join(f"{r.step.id}:{r.step.agent} ({r.duration:.2f}s)" for r in self.critical_path)
+        return (f"Wall time: {self.wall_time:.2f}s, critical path: {self.critical_path_time:.2f}s, "
+                f"sum of steps: {self.total_step_time:.2f}s\nCritical path: {path}")
+
+
+class DagExecutor:
+    """Runs plan steps as soon as the steps they depend on are done.
+
+    ``run_step(step, upstream)`` is called with ``upstream``, a dict of dependency id -> StepRecord,
+    and returns the step response. ``on_result(step, response)`` is called as each step succeeds.
+    ``submit(fn, step, *args)`` hands ``fn(step, *args)`` to a shared pool (e.g. the ExecutionService)
+    and returns a future; it may call ``fn`` with another step in place of ``step`` (hedging). By
+    default the run gets its own thread pool.
+
+    ``timeout(step)`` returns the seconds a step may take, None for no limit. A step past its
+    timeout, or still running at the deadline of ``run``, is abandoned and fails with TimeoutError.
+
+    Steps can keep arriving while the run is going (a plan streamed in by the planner): ``run``
+    takes them from a StepFeed, ``arun`` from an async iterator. A step may depend on steps that
+    have not arrived yet; once the plan is complete, dependencies on steps it does not contain are
+    dropped and steps on a dependency cycle fail.
+    """
+
+    def __init__(self, run_step, max_workers=None, verbose=False, on_result=None, submit=None, timeout=None):
+        self.run_step = run_step
+        self.submit = submit
+        self.timeout = timeout
+        self.on_result = on_result
+        self.max_workers = max_workers
+        self.verbose = verbose
+
+    def _upstream(self, records, step):
+        return {dep: records[dep] for dep in step.depends_on if dep in records}
+
+    def _ready(self, records, step):
+        return all(dep in records and records[dep].end is not None for dep in step.depends_on)
+
+    def _add(self, records, step, renumbered):
+        # streamed steps may come without ids, numbered from 0 or with repeated ones: they get the next
+        # free id, and the dependencies of the later steps on their planner id follow them (`renumbered`
+        # maps the planner ids to the new ones, like normalize_dependencies does for a whole plan)
+        step.depends_on = [renumbered.get(dep, dep) for dep in step.depends_on]
+        if step.id <= 0 or step.id in records:
+            renumbered[step.id] = max(records, default=0) + 1
+            step.id = renumbered[step.id]
+        step.depends_on = sorted({dep for dep in step.depends_on if dep != step.id})
+        records[step.id] = StepRecord(step)
+
+    def _drop_unknown_dependencies(self, records):
+        for record in records.values():
+            record.step.depends_on = [dep for dep in record.step.depends_on if dep in records]
+
+    def _step_deadline(self, step, deadline):
+        timeout = self.timeout(step) if self.timeout is not None else None
+        return earliest(time.perf_counter() + timeout if timeout is not None else None, deadline)
+
+    def _call(self, step, record, upstream):
+        if record.start is None:
+            record.start = time.perf_counter()
+        return self.run_step(step, upstream)
+
+    def _fail(self, record, exc):
+        record.error = exc
+        record.end = time.perf_counter()
+        if record.start is None:
+            record.start = record.end
+        print(f"Step {record.step.id} ({record.step.agent}) generated an exception: {exc}")
+
+    def _finish(self, record, future):
+        try:
+            record.response = future.result()
+        except Exception as exc:
+            self._fail(record, exc)
+            return
+        record.end = time.perf_counter()
+        if self.on_result is not None:
+            self.on_result(record.step, record.response)
+
+    def run(self, steps, deadline=None, feed=None):
+        # `deadline` is a time.perf_counter() value for the whole run, None for no limit
+        start = time.perf_counter()
+        records = {}
+        renumbered = {}
+        for step in steps:
+            self._add(records, step, renumbered)
+        pending = set(records)
+        streaming = feed is not None
+        running = {}  # future -> (record, deadline of the step)
+        executor = None
+        submit = self.submit
+        if submit is None:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            submit = lambda fn, step, *args: executor.submit(fn, step, *args)
+        try:
+            while pending or running or streaming:
+                if streaming:
+                    arrived, complete = feed.take()
+                    for step in arrived:
+                        self._add(records, step, renumbered)
+                        pending.add(step.id)
+                    if complete:
+                        streaming = False
+                        self._drop_unknown_dependencies(records)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    for step_id in sorted(pending):
+                        self._fail(records[step_id], TimeoutError("task deadline reached before the step started"))
+                    pending.clear()
+                    if streaming:
+                        # the steps the planner still writes could not start anyway: stop waiting for them
+                        # (waiting on the feed with no time left would spin until the plan is complete)
+                        streaming = False
+                        self._drop_unknown_dependencies(records)
+                for step_id in sorted(pending):
+                    step = records[step_id].step
+                    if self._ready(records, step):
+                        pending.discard(step_id)
+                        future = submit(self._call, step, records[step_id], self._upstream(records, step))
+                        running[future] = (records[step_id], self._step_deadline(step, deadline))
+                if not running and not streaming:
+                    for step_id in sorted(pending):
+                        self._fail(records[step_id], ValueError("the step is on a dependency cycle"))
+                    break
+                next_deadline = earliest(deadline, *(step_deadline for _, step_deadline in running.values()))
+                watched = set(running) | {feed.signal} if streaming else set(running)
+                done, _ = wait(watched, timeout=time_left(next_deadline), return_when=FIRST_COMPLETED)
+                for future in done & set(running):
+                    record, _ = running.pop(future)
+                    self._finish(record, future)
+                now = time.perf_counter()
+                for future, (record, step_deadline) in list(running.items()):
+                    if step_deadline is not None and now >= step_deadline:
+                        # a running thread cannot be killed: the straggler is abandoned and its result ignored
+                        del running[future]
+                        future.cancel()
+                        self._fail(record, TimeoutError(f"no response after {now - (record.start or now):.1f}s"))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        return RunReport(records, start, time.perf_counter())
+
+    async def _atimed(self, record, upstream, semaphore, deadline):
+        async with semaphore:
+            record.start = time.perf_counter()
+            step_deadline = self._step_deadline(record.step, deadline)
+            try:
+                try:
+                    record.response = await asyncio.wait_for(self.run_step(record.step, upstream), time_left(step_deadline))
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"no response after {time.perf_counter() - record.start:.1f}s")
+                if self.on_result is not None:
+                    self.on_result(record.step, record.response)
+            except Exception as exc:
+                record.error = exc
+                print(f"Step {record.step.id} ({record.step.agent}) generated an exception: {exc}")
+            finally:
+                record.end = time.perf_counter()
+
+    async def arun(self, steps, semaphore=None, deadline=None, source=None):
+        # with the async variant, `run_step` must be a coroutine function; `source` is an async iterator of more steps
+        start = time.perf_counter()
+        semaphore = semaphore or asyncio.Semaphore(self.max_workers or len(steps) or 1)
+        loop = asyncio.get_running_loop()
+        records = {}
+        renumbered = {}
+        finished = {}  # step id -> future done when the step has ended
+        tasks = {}
+
+        def finished_future(step_id):
+            if step_id not in finished:
+                finished[step_id] = loop.create_future()
+            return finished[step_id]
+
+        async def run(step):
+            if step.depends_on:
+                await asyncio.gather(*(finished_future(dep) for dep in step.depends_on))
+            try:
+                await self._atimed(records[step.id], self._upstream(records, step), semaphore, deadline)
+            finally:
+                if not finished_future(step.id).done():
+                    finished_future(step.id).set_result(None)
+
+        def add(step):
+            self._add(records, step, renumbered)
+            tasks[step.id] = asyncio.ensure_future(run(step))
+
+        for step in steps:
+            add(step)
+        if source is not None:
+            async for step in source:
+                add(step)
+            self._drop_unknown_dependencies(records)
+            for step_id, future in finished.items():
+                if step_id not in records and not future.done():
+                    future.set_result(None)
+            for step_id in unresolvable([record.step for record in records.values()]):
+                tasks[step_id].cancel()
+                self._fail(records[step_id], ValueError("the step is on a dependency cycle"))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return RunReport(records, start, time.perf_counter())
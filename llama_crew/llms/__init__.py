@@ -0,0 +1,7 @@
+from .context import call_site, current_call_site, no_cache
+from .wrapper import ToolCallingLLM, WrappedLLM, function_calling_llm, unwrap_llm
+from .cache import CachedLLM, LLMResponseCache, install_llm_cache
+from .rate_limit import RateLimitedLLM, get_rate_limiter
+from .resilient import LatencyHistogram, ResilientLLM, is_transient
+from .structured import extract_json, repair_prompt
+from .phases import CONTROL_SITES, MODEL_PRICES, PhaseMetrics, PhaseRoutedLLM
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from llama_index.core.base.llms.types import CompletionResponse
+from llama_index.core.bridge.pydantic import PrivateAttr
+from .context import cache_bypassed, current_call_site
+from .wrapper import WrappedLLM, unwrap_llm
+
+# attributes of the wrapped LLM that change its output and are part of the cache key
+KEY_ATTRIBUTES = ("model", "temperature", "max_tokens", "additional_kwargs", "api_base")
+
+
+class LLMResponseCache:
+    """Two tier cache of completion texts: an in-memory LRU in front of an optional SQLite file.
+
+    Args:
+        max_size (int): number of responses kept in memory.
+        path (str): SQLite file of the on-disk tier, None for memory only.
+        ttl (float): default seconds a response stays valid, None for no expiry.
+        ttls (dict): per call site TTL overrides, e.g. ``{"can_stop": 600}``.
+        bypass (iterable): call sites that are never cached (non-deterministic or side-effecting calls).
+    """
+
+    def __init__(self, max_size=1024, path=None, ttl=24 * 3600, ttls=None, bypass=()):
+        self.max_size = max_size
+        self.path = path
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.bypass = set(bypass)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, call_site TEXT, response TEXT, created REAL, expires REAL)"
+            )
+            self._db.commit()
+
+    def enabled_for(self, site):
+        return not cache_bypassed() and site not in self.bypass
+
+    def _expires(self, site):
+        ttl = self.ttls.get(site, self.ttl)
+        return None if ttl is None else time.time() + ttl
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires = entry
+                if expires is None or expires > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT response, expires FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and (row[1] is None or row[1] > now):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def _remember(self, key, response, expires):
+        self._memory[key] = (response, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def put(self, key, response, site=None):
+        expires = self._expires(site)
+        with self._lock:
+            self._remember(key, response, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, call_site, response, created, expires) VALUES (?, ?, ?, ?, ?)",
+                    (key, site, response, time.time(), expires),
+                )
+                self._db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedLLM(WrappedLLM):
+    """Memoizes ``complete``/``acomplete`` of the wrapped LLM in an LLMResponseCache.
+
+    The key is built from the model, its sampling parameters, the prompt and the call arguments.
+    The call site (see ``llama_crew.llms.call_site``) selects the TTL and the bypass rules.
+    Streaming and chat calls are passed through. Cached responses carry ``cache_hit`` in their
+    ``additional_kwargs``, so the wrappers above (e.g. the phase metrics) do not count them as
+    provider calls.
+    """
+
+    _cache: Any = PrivateAttr()
+
+    def __init__(self, llm, cache=None, **kwargs: Any) -> None:
+        super().__init__(llm=llm, **kwargs)
+        self._cache = cache or LLMResponseCache()
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def cache_key(self, prompt, formatted, kwargs):
+        inner = unwrap_llm(self.llm)
+        params = {name: getattr(inner, name, None) for name in KEY_ATTRIBUTES}
+        payload = json.dumps(
+            {"class": inner.class_name(), "params": params, "prompt": prompt, "formatted": formatted, "kwargs": kwargs},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        site = current_call_site()
+        if not self._cache.enabled_for(site):
+            return self.llm.complete(prompt, formatted=formatted, **kwargs)
+        key = self.cache_key(prompt, formatted, kwargs)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return CompletionResponse(text=cached, additional_kwargs={"cache_hit": True})
+        response = self.llm.complete(prompt, formatted=formatted, **kwargs)
+        self._cache.put(key, response.text, site)
+        return response
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        site = current_call_site()
+        if not self._cache.enabled_for(site):
+            return await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+        key = self.cache_key(prompt, formatted, kwargs)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return CompletionResponse(text=cached, additional_kwargs={"cache_hit": True})
+        response = await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+        self._cache.put(key, response.text, site)
+        return response
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "cached_llm"
+
+
+def install_llm_cache(llm, cache=None, **cache_config):
+    """Wraps ``llm`` in a CachedLLM; ``cache_config`` is passed to LLMResponseCache when no cache is given."""
+    if isinstance(llm, CachedLLM):
+        return llm
+    return CachedLLM(llm, cache=cache or LLMResponseCache(**cache_config))
@@ -0,0 +1,34 @@
+import contextvars
+from contextlib import contextmanager
+
+# Name of the code path making the current LLM call ("generate_plan", "can_stop", "agent", ...).
+# LLM wrappers use it to apply per-call-site policies without changing the `complete` signature.
+_call_site = contextvars.ContextVar("llm_call_site", default=None)
+_cache_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def current_call_site():
+    return _call_site.get()
+
+
+@contextmanager
+def call_site(name):
+    token = _call_site.set(name)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+def cache_bypassed():
+    return _cache_bypass.get()
+
+
+@contextmanager
+def no_cache():
+    """Calls made inside this block are never served from, nor stored in, the LLM response cache."""
+    token = _cache_bypass.set(True)
+    try:
+        yield
+    finally:
+        _cache_bypass.reset(token)
@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+)
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.llm import LLM
+from .context import current_call_site
+from .rate_limit import estimate_tokens
+from .wrapper import WrappedLLM, unwrap_llm
+
+# classification-like calls: a short prompt and a yes/no, a name or a score as the answer
+CONTROL_SITES = ("can_stop", "decompose_task", "eval_response", "route")
+
+# USD per million (prompt, completion) tokens; override or extend with the `prices` of agents.yaml
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+}
+
+
+def model_name(llm):
+    return getattr(unwrap_llm(llm), "model", None) or llm.metadata.model_name
+
+
+def _usage(response, prompt):
+    """(prompt, completion) tokens of a completion or chat response: the provider's usage when reported, an estimate otherwise."""
+    raw = response.raw
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if isinstance(usage, dict):
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    else:
+        prompt_tokens, completion_tokens = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    text = response.message.content if isinstance(response, ChatResponse) else response.text
+    return prompt_tokens or estimate_tokens(prompt), completion_tokens or estimate_tokens(text or "")
+
+
+def _messages_text(messages):
+    return "".join(str(message.content or "") for message in messages)
+
+
+class PhaseMetrics:
+    """Calls, latency, tokens and cost per (call site, model), shared by every PhaseRoutedLLM of a run.
+
+    Responses served by the LLM response cache are counted as ``cache_hits``: they are not
+    provider calls and cost nothing.
+    """
+
+    def __init__(self, prices=None):
+        self.prices = dict(MODEL_PRICES, **{model: tuple(price) for model, price in (prices or {}).items()})
+        self._lock = threading.Lock()
+        self._phases = defaultdict(lambda: {"calls": 0, "cache_hits": 0, "latency": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1e6
+
+    def record(self, site, model, latency, prompt_tokens, completion_tokens, cache_hit=False):
+        with self._lock:
+            phase = self._phases[(site, model)]
+            if cache_hit:
+                phase["cache_hits"] += 1
+                return
+            phase["calls"] += 1
+            phase["latency"] += latency
+            phase["prompt_tokens"] += prompt_tokens
+            phase["completion_tokens"] += completion_tokens
+
+    def stats(self):
+        with self._lock:
+            phases = {key: dict(phase) for key, phase in self._phases.items()}
+        stats = {}
+        for (site, model), phase in sorted(phases.items()):
+            stats[f"{site}/{model}"] = {
+                "calls": phase["calls"],
+                "cache_hits": phase["cache_hits"],
+                "avg_latency": phase["latency"] / phase["calls"] if phase["calls"] else 0.0,
+                "total_latency": phase["latency"],
+                "prompt_tokens": phase["prompt_tokens"],
+                "completion_tokens": phase["completion_tokens"],
+                # None for a model missing from the price table
+                "cost": self.cost(model, phase["prompt_tokens"], phase["completion_tokens"]),
+            }
+        return stats
+
+    def report(self):
+        lines = [f"{'phase/model':<40} {'calls':>6} {'cached':>6} {'avg s':>8} {'total s':>9} {'tokens in':>10} {'tokens out':>10} {'cost $':>10}"]
+        total = 0.0
+        for name, phase in self.stats().items():
+            cost = "n/a" if phase["cost"] is None else f"{phase['cost']:.5f}"
+            total += phase["cost"] or 0.0
+            lines.append(f"{name:<40} {phase['calls']:>6} {phase['cache_hits']:>6} {phase['avg_latency']:>8.2f} {phase['total_latency']:>9.2f} "
+                         f"{phase['prompt_tokens']:>10} {phase['completion_tokens']:>10} {cost:>10}")
+        lines.append(f"{'total':<40} {'':>6} {'':>6} {'':>8} {'':>9} {'':>10} {'':>10} {total:>10.5f}")
+        return "\n".join(lines)
+
+
+class PhaseRoutedLLM(WrappedLLM):
+    """Sends every completion to the LLM configured for its call site, ``llm`` when there is none.
+
+    With ``phases={"can_stop": small_llm, ...}`` the classification-like calls of the orchestrator
+    go to a small fast model while planning and combining keep the large one. Each call is
+    recorded in ``metrics`` under its call site and model. Chat calls (the steps of function
+    calling agents, under the "agent" call site) are routed and recorded the same way.
+    """
+
+    phases: Dict[str, LLM] = Field(default_factory=dict, description="The LLM of each call site.")
+
+    _metrics: Any = PrivateAttr()
+
+    def __init__(self, llm, phases=None, metrics: Optional[PhaseMetrics] = None, **kwargs: Any) -> None:
+        super().__init__(llm=llm, phases=phases or {}, **kwargs)
+        self._metrics = metrics or PhaseMetrics()
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def _route(self):
+        site = current_call_site() or "default"
+        return site, self.phases.get(site, self.llm)
+
+    def _record(self, site, llm, start, prompt, response):
+        # a CachedLLM below this wrapper flags the responses that never reached the provider
+        cache_hit = response.additional_kwargs.get("cache_hit", False)
+        self._metrics.record(site, model_name(llm), time.perf_counter() - start, *_usage(response, prompt), cache_hit=cache_hit)
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        site, llm = self._route()
+        start = time.perf_counter()
+        response = llm.complete(prompt, formatted=formatted, **kwargs)
+        self._record(site, llm, start, prompt, response)
+        return response
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        site, llm = self._route()
+        start = time.perf_counter()
+        response = await llm.acomplete(prompt, formatted=formatted, **kwargs)
+        self._record(site, llm, start, prompt, response)
+        return response
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        site, llm = self._route()
+        start = time.perf_counter()
+        stream = llm.stream_complete(prompt, formatted=formatted, **kwargs)
+
+        def gen():
+            response = None
+            for response in stream:
+                yield response
+            # a streamed phase is timed until its last chunk
+            if response is not None:
+                self._record(site, llm, start, prompt, response)
+        return gen()
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        site, llm = self._route()
+        start = time.perf_counter()
+        stream = await llm.astream_complete(prompt, formatted=formatted, **kwargs)
+
+        async def gen():
+            response = None
+            async for response in stream:
+                yield response
+            if response is not None:
+                self._record(site, llm, start, prompt, response)
+        return gen()
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        site, llm = self._route()
+        start = time.perf_counter()
+        response = llm.chat(messages, **kwargs)
+        self._record(site, llm, start, _messages_text(messages), response)
+        return response
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        site, llm = self._route()
+        start = time.perf_counter()
+        response = await llm.achat(messages, **kwargs)
+        self._record(site, llm, start, _messages_text(messages), response)
+        return response
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        site, llm = self._route()
+        start = time.perf_counter()
+        stream = llm.stream_chat(messages, **kwargs)
+
+        def gen():
+            response = None
+            for response in stream:
+                yield response
+            if response is not None:
+                self._record(site, llm, start, _messages_text(messages), response)
+        return gen()
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        site, llm = self._route()
+        start = time.perf_counter()
+        stream = await llm.astream_chat(messages, **kwargs)
+
+        async def gen():
+            response = None
+            async for response in stream:
+                yield response
+            if response is not None:
+                self._record(site, llm, start, _messages_text(messages), response)
+        return gen()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "phase_routed_llm"
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import ChatMessage
+from llama_index.core.bridge.pydantic import PrivateAttr
+from .wrapper import WrappedLLM, unwrap_llm
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; only used for budgeting, not billing
+    return max(1, len(str(text)) // 4)
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` units per second, holding at most ``capacity`` units."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount):
+        # takes `amount` now (possibly going negative) and returns how long the caller must wait
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, amount=1):
+        delay = self._reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self, amount=1):
+        delay = self._reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class ProviderRateLimiter:
+    """Requests-per-minute and tokens-per-minute limits of one model / API base."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.calls = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    def _record(self, delay):
+        self.calls += 1
+        if delay > 0:
+            self.throttled += 1
+            self.total_wait += delay
+
+    def acquire(self, tokens):
+        delay = 0.0
+        if self.requests is not None:
+            delay += self.requests.acquire(1)
+        if self.tokens is not None:
+            delay += self.tokens.acquire(tokens)
+        self._record(delay)
+
+    async def aacquire(self, tokens):
+        delay = 0.0
+        if self.requests is not None:
+            delay += await self.requests.aacquire(1)
+        if self.tokens is not None:
+            delay += await self.tokens.aacquire(tokens)
+        self._record(delay)
+
+    def stats(self):
+        return {"calls": self.calls, "throttled": self.throttled, "total_wait": self.total_wait}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model, api_base=None, requests_per_minute=None, tokens_per_minute=None):
+    """Returns the process-wide limiter of a model / API base, creating it with the given limits."""
+    key = (model, api_base)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = ProviderRateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiters[key]
+
+
+class RateLimitedLLM(WrappedLLM):
+    """Waits for the provider's request and token budget before every call of the wrapped LLM.
+
+    LLMs wrapping the same model and API base share one limiter, so all the orchestrators and
+    agents of the process stay under the provider limits together.
+    """
+
+    _limiter: Any = PrivateAttr()
+
+    def __init__(self, llm, requests_per_minute=None, tokens_per_minute=None, **kwargs: Any) -> None:
+        super().__init__(llm=llm, **kwargs)
+        inner = unwrap_llm(llm)
+        self._limiter = get_rate_limiter(
+            getattr(inner, "model", inner.metadata.model_name),
+            getattr(inner, "api_base", None),
+            requests_per_minute,
+            tokens_per_minute,
+        )
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    def _budget(self, text):
+        return estimate_tokens(text) + (getattr(unwrap_llm(self.llm), "max_tokens", None) or 0)
+
+    def _messages_text(self, messages: Sequence[ChatMessage], tools=None):
+        # the tool schemas of function calling requests are sent as input tokens too
+        return "".join(str(message.content or "") for message in messages) + (str(tools) if tools else "")
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        self._limiter.acquire(self._budget(prompt))
+        return self.llm.complete(prompt, formatted=formatted, **kwargs)
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        await self._limiter.aacquire(self._budget(prompt))
+        return await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        self._limiter.acquire(self._budget(prompt))
+        return self.llm.stream_complete(prompt, formatted=formatted, **kwargs)
+
+    async def astream_complete(self, prompt, formatted=False, **kwargs):
+        await self._limiter.aacquire(self._budget(prompt))
+        return await self.llm.astream_complete(prompt, formatted=formatted, **kwargs)
+
+    def chat(self, messages, **kwargs):
+        self._limiter.acquire(self._budget(self._messages_text(messages, kwargs.get("tools"))))
+        return self.llm.chat(messages, **kwargs)
+
+    async def achat(self, messages, **kwargs):
+        await self._limiter.aacquire(self._budget(self._messages_text(messages, kwargs.get("tools"))))
+        return await self.llm.achat(messages, **kwargs)
+
+    def stream_chat(self, messages, **kwargs):
+        self._limiter.acquire(self._budget(self._messages_text(messages, kwargs.get("tools"))))
+        return self.llm.stream_chat(messages, **kwargs)
+
+    async def astream_chat(self, messages, **kwargs):
+        await self._limiter.aacquire(self._budget(self._messages_text(messages, kwargs.get("tools"))))
+        return await self.llm.astream_chat(messages, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "rate_limited_llm"
@@ -0,0 +1,218 @@
+import asyncio
+import bisect
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, CompletionResponse
+from llama_index.core.bridge.pydantic import PrivateAttr
+from .context import current_call_site
+from .wrapper import WrappedLLM
+
+# upper bounds (seconds) of the latency histogram buckets, the last one catches everything slower
+BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, float("inf"))
+TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "ServiceUnavailableError"}
+
+
+def is_transient(exc):
+    """Whether an LLM call failing with ``exc`` is worth retrying (rate limits, timeouts, 5xx)."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if getattr(exc, "status_code", None) in TRANSIENT_STATUS:
+        return True
+    return type(exc).__name__ in TRANSIENT_ERRORS
+
+
+class LatencyHistogram:
+    """Latencies of one call site: bucket counts over the whole run, percentiles over the last ``window`` calls."""
+
+    def __init__(self, window=200):
+        self.counts = [0] * len(BUCKETS)
+        self.recent = deque(maxlen=window)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS, latency)] += 1
+            self.recent.append(latency)
+            self.total += 1
+
+    def percentile(self, q):
+        with self._lock:
+            recent = sorted(self.recent)
+        if not recent:
+            return None
+        return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+    def stats(self):
+        return {
+            "count": self.total,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {f"<={bound}s": count for bound, count in zip(BUCKETS, self.counts) if count},
+        }
+
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+        return _hedge_executor
+
+
+class ResilientLLM(WrappedLLM):
+    """Retries, backoff and hedging around the completion and chat calls of the wrapped LLM.
+
+    - transient errors (rate limits, timeouts, 5xx) are retried with jittered exponential backoff;
+    - once a call site has ``hedge_min_samples`` latencies, a call slower than the site's rolling
+      ``hedge_percentile`` latency gets a duplicate request, and the first response wins;
+    - every call site keeps a latency histogram (``latency_stats()``).
+
+    The slower request of a hedged pair is not cancelled on the sync path (a thread cannot be
+    interrupted), its response is dropped. Streaming calls are passed through: a stream that
+    already produced tokens cannot be retried.
+    """
+
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    hedge: bool = True
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 20
+
+    _histograms: Any = PrivateAttr()
+    _counters: Any = PrivateAttr()
+
+    def __init__(self, llm, **kwargs: Any) -> None:
+        super().__init__(llm=llm, **kwargs)
+        self._histograms = defaultdict(LatencyHistogram)
+        self._counters = defaultdict(int)
+
+    def _site(self):
+        return current_call_site() or "default"
+
+    def _hedge_delay(self, site):
+        if not self.hedge:
+            return None
+        histogram = self._histograms[site]
+        if len(histogram.recent) < self.hedge_min_samples:
+            return None
+        return histogram.percentile(self.hedge_percentile)
+
+    def _backoff(self, attempt):
+        # "full jitter": uniform in [0, min(max_delay, base_delay * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _timed(self, site, call):
+        start = time.perf_counter()
+        response = call()
+        self._histograms[site].record(time.perf_counter() - start)
+        return response
+
+    def _hedged(self, site, call):
+        delay = self._hedge_delay(site)
+        if delay is None:
+            return self._timed(site, call)
+        executor = _get_hedge_executor()
+        # pool threads do not inherit the call site, the requests run in a copy of the caller's context
+        submit = lambda: executor.submit(contextvars.copy_context().run, self._timed, site, call)
+        attempts = {submit()}
+        done, _ = wait(attempts, timeout=delay)
+        if not done:
+            self._counters["hedged"] += 1
+            attempts.add(submit())
+        error = None
+        while attempts:
+            done, attempts = wait(attempts, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+
+    def _call(self, call):
+        site = self._site()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._hedged(site, call)
+            except Exception as exc:
+                if attempt == self.max_retries or not is_transient(exc):
+                    self._counters["failed"] += 1
+                    raise
+                self._counters["retried"] += 1
+                time.sleep(self._backoff(attempt))
+
+    async def _atimed(self, site, call):
+        start = time.perf_counter()
+        response = await call()
+        self._histograms[site].record(time.perf_counter() - start)
+        return response
+
+    async def _ahedged(self, site, call):
+        delay = self._hedge_delay(site)
+        if delay is None:
+            return await self._atimed(site, call)
+        attempts = {asyncio.ensure_future(self._atimed(site, call))}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                self._counters["hedged"] += 1
+                attempts.add(asyncio.ensure_future(self._atimed(site, call)))
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _acall(self, call):
+        site = self._site()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._ahedged(site, call)
+            except Exception as exc:
+                if attempt == self.max_retries or not is_transient(exc):
+                    self._counters["failed"] += 1
+                    raise
+                self._counters["retried"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self._call(lambda: self.llm.complete(prompt, formatted=formatted, **kwargs))
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self._acall(lambda: self.llm.acomplete(prompt, formatted=formatted, **kwargs))
+
+    # agent steps (function calling) are chat requests
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self._call(lambda: self.llm.chat(messages, **kwargs))
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self._acall(lambda: self.llm.achat(messages, **kwargs))
+
+    def latency_stats(self):
+        return {site: histogram.stats() for site, histogram in self._histograms.items()}
+
+    def stats(self):
+        return {"retried": self._counters["retried"], "hedged": self._counters["hedged"], "failed": self._counters["failed"]}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "resilient_llm"
@@ -0,0 +1,25 @@
+import re
+
+FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def extract_json(text):
+    """The JSON object in an LLM response, without the prose or the markdown fences around it."""
+    text = str(text).strip()
+    fenced = FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        return text[start:end + 1]
+    return text
+
+
+def repair_prompt(prompt, response, error):
+    """Re-asks for a structured output that could not be parsed, quoting the parse error."""
+    return (
+        f"{prompt}\n\n"
+        f"Your previous answer was:\n{response}\n\n"
+        f"It could not be used because of this error: {error}\n"
+        "Answer again with only the JSON object, following the schema above exactly."
+    )
@@ -0,0 +1,149 @@
+from typing import Any, Sequence
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import LLM
+
+from .context import call_site, current_call_site
+
+
+class WrappedLLM(CustomLLM):
+    """Base class of the LLM wrappers: delegates every call to the wrapped ``llm``.
+
+    Wrappers are LLMs themselves, so they can be passed anywhere an LLM is expected
+    (Orchestrator, SimpleAgentWorker) and stacked on top of each other. Subclasses
+    override the completion methods they add behaviour to.
+    """
+
+    llm: LLM = Field(description="The wrapped LLM.")
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return self.llm.complete(prompt, formatted=formatted, **kwargs)
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        return self.llm.stream_complete(prompt, formatted=formatted, **kwargs)
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        return await self.llm.astream_complete(prompt, formatted=formatted, **kwargs)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return self.llm.chat(messages, **kwargs)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        return await self.llm.achat(messages, **kwargs)
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        return self.llm.stream_chat(messages, **kwargs)
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        return await self.llm.astream_chat(messages, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "wrapped_llm"
+
+
+def unwrap_llm(llm):
+    """Returns the innermost LLM, e.g. to read the provider's model name or settings."""
+    while isinstance(llm, (WrappedLLM, ToolCallingLLM)):
+        llm = llm.llm
+    return llm
+
+
+class ToolCallingLLM(FunctionCallingLLM):
+    """Function calling API over a stack of wrappers, for FunctionCallingAgentWorker.
+
+    The provider LLM at the bottom of ``llm`` prepares the tool calling requests and parses the
+    tool calls of the responses, while the requests themselves go through ``llm``, so agent steps
+    get the rate limiting, retries and metrics of the wrappers. Calls are tagged with the "agent"
+    call site unless the caller set one.
+    """
+
+    llm: LLM = Field(description="The wrapped LLM, a wrapper stack over a function calling LLM.")
+
+    def __init__(self, llm, **kwargs: Any) -> None:
+        super().__init__(llm=llm, **kwargs)
+
+    @property
+    def provider(self) -> FunctionCallingLLM:
+        return unwrap_llm(self.llm)
+
+    @property
+    def model(self):
+        return getattr(self.provider, "model", self.metadata.model_name)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    def _site(self):
+        return call_site(current_call_site() or "agent")
+
+    def _prepare_chat_with_tools(self, tools, user_msg=None, chat_history=None, verbose=False, allow_parallel_tool_calls=False, **kwargs: Any):
+        return self.provider._prepare_chat_with_tools(tools, user_msg=user_msg, chat_history=chat_history, verbose=verbose,
+                                                      allow_parallel_tool_calls=allow_parallel_tool_calls, **kwargs)
+
+    def _validate_chat_with_tools_response(self, response, tools, allow_parallel_tool_calls=False, **kwargs: Any):
+        return self.provider._validate_chat_with_tools_response(response, tools, allow_parallel_tool_calls=allow_parallel_tool_calls, **kwargs)
+
+    def get_tool_calls_from_response(self, response, error_on_no_tool_call=True, **kwargs: Any):
+        return self.provider.get_tool_calls_from_response(response, error_on_no_tool_call=error_on_no_tool_call, **kwargs)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with self._site():
+            return self.llm.chat(messages, **kwargs)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with self._site():
+            return await self.llm.achat(messages, **kwargs)
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        with self._site():
+            return self.llm.stream_chat(messages, **kwargs)
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        with self._site():
+            return await self.llm.astream_chat(messages, **kwargs)
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        with self._site():
+            return self.llm.complete(prompt, formatted=formatted, **kwargs)
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        with self._site():
+            return await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        with self._site():
+            return self.llm.stream_complete(prompt, formatted=formatted, **kwargs)
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        with self._site():
+            return await self.llm.astream_complete(prompt, formatted=formatted, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "tool_calling_llm"
+
+
+def function_calling_llm(llm):
+    """The LLM to give FunctionCallingAgentWorker: ``llm`` itself if it is a provider LLM, a ToolCallingLLM over a wrapper stack."""
+    return ToolCallingLLM(llm) if isinstance(llm, WrappedLLM) else llm
@@ -0,0 +1,65 @@
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i in is it its me my of on or "
+    "please so than that the their them then there these this those to was what when where which "
+    "who why will with you your".split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+class BM25:
+    """Okapi BM25 scorer over a small, in-memory list of texts."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._index([Counter(tokenize(document)) for document in documents])
+
+    def _index(self, term_freqs):
+        self.term_freqs = term_freqs
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_freqs = Counter()
+        for freqs in self.term_freqs:
+            document_freqs.update(freqs.keys())
+        n = len(self.term_freqs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_freqs.items()}
+
+    def to_dict(self):
+        return {"k1": self.k1, "b": self.b, "term_freqs": [dict(freqs) for freqs in self.term_freqs]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a scorer saved with ``to_dict`` without tokenizing the documents again."""
+        bm25 = cls([], k1=data["k1"], b=data["b"])
+        bm25._index([Counter(freqs) for freqs in data["term_freqs"]])
+        return bm25
+
+    def __len__(self):
+        return len(self.term_freqs)
+
+    def scores(self, query):
+        terms = tokenize(query)
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def top_k(self, query, k, min_score=0.0):
+        """Returns ``(index, score)`` pairs of the ``k`` best documents scoring above ``min_score``."""
+        ranked = sorted(enumerate(self.scores(query)), key=lambda item: -item[1])
+        return [(index, score) for index, score in ranked[:k] if score > min_score]
@@ -1,5 +1,7 @@
 import yaml
 import importlib
+import time
+from .lazy import LazyFunction, read_function_metadata
 
 class Tool:
     def __init__(self, config):
@@ -7,14 +9,64 @@ class Tool:
         self.module = config['module']
         self.function = config['function']
         self.asis = config.get('asis', False)
-        self.instance = self.load_tool()
+        # when set, `function` is a factory that is called with these keyword arguments to build the tool
+        self.params = config.get('params')
+        # packages the function imports in its body (e.g. yfinance): imported with the tool, so that
+        # their import time is part of its cold start rather than of its first call
+        self.imports = config.get('imports', [])
+        # lazy tools are only imported when first called (or, for asis tools, when first used by an agent)
+        self.lazy = config.get('lazy', True)
+        self.load_time = None
+        self._instance = None
+        if not self.lazy:
+            self._instance = self.load_tool()
+
+    @property
+    def instance(self):
+        if self._instance is None:
+            deferrable = self.lazy and not self.asis and self.params is None
+            self._instance = self._lazy_instance() if deferrable else self.load_tool()
+        return self._instance
+
+    @property
+    def loaded(self):
+        return self.load_time is not None
+
+    def _lazy_instance(self):
+        metadata = read_function_metadata(self.module, self.function)
+        if metadata is None:
+            # the function can't be described from source, import it now
+            return self.load_tool()
+        doc, signature = metadata
+        return LazyFunction(self.load_tool, self.function, doc, signature, module=self.module)
 
     def load_tool(self):
+        start = time.perf_counter()
+        for name in self.imports:
+            importlib.import_module(name)
         module = importlib.import_module(self.module)
         tool_func = getattr(module, self.function)
+        if self.params is not None:
+            tool_func = tool_func(**self.params)
+        self.load_time = time.perf_counter() - start
         return tool_func
 
 def load_tools_config(file_path):
     with open(file_path, 'r') as file:
         tools_config = yaml.safe_load(file)
-    return tools_config
\ No newline at end of file
+    return tools_config
+
+def tool_load_report(tools):
+    """Returns a table with the cold-start (import) time of each tool: its module and its `imports`.
+
+    A module shared by several tools is charged to the first tool that imported it.
+    Tools that were never called show up as deferred.
+    """
+    lines = [f"{'Tool':<40} {'Module':<35} {'Status':<10} {'Load time':>10}", "-" * 98]
+    for tool in sorted(tools, key=lambda t: -(t.load_time or 0)):
+        status = "loaded" if tool.loaded else "deferred"
+        load_time = f"{tool.load_time * 1000:.1f} ms" if tool.loaded else "-"
+        lines.append(f"{tool.name:<40} {tool.module:<35} {status:<10} {load_time:>10}")
+    total = sum(tool.load_time or 0 for tool in tools)
+    lines.append(f"{'Total':<87} {total * 1000:.1f} ms")
+    return "\n".join(lines)
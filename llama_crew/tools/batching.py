@@ -0,0 +1,100 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Batch:
+    def __init__(self):
+        self.futures = {}  # key -> Future of its value
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """Coalesces the lookups of concurrent callers into batched upstream requests.
+
+    The first lookup of a window waits ``window`` seconds (or until ``max_batch`` keys are pending),
+    then sends every key requested meanwhile, by any thread, in one ``fetch(keys)`` call and hands
+    each caller its values. ``fetch`` returns a dict ``key -> value``; keys missing from it get None.
+    A key requested by several callers is fetched once.
+
+    Args:
+        fetch: function fetching a list of keys at once, e.g. ``yf.download`` of several tickers.
+        window (float): seconds the first lookup of a batch waits for others.
+        max_batch (int): number of keys that sends the batch without waiting for the end of the window.
+    """
+
+    def __init__(self, fetch, window=0.05, max_batch=50, name=None):
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name or getattr(fetch, "__name__", "batcher")
+        self._batch = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.batches = 0
+        self.keys = 0
+        self.errors = 0
+        self._fetch_time = 0.0
+        _batchers[self.name] = self
+
+    def get(self, key):
+        return self.get_many([key])[key]
+
+    def get_many(self, keys):
+        """Values of ``keys``, fetched in a batch with the keys of the concurrent callers."""
+        with self._lock:
+            self.lookups += 1
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch()
+            for key in keys:
+                batch.futures.setdefault(key, Future())
+            if len(batch.futures) >= self.max_batch:
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                # later lookups start the next batch
+                if self._batch is batch:
+                    self._batch = None
+            self._send(batch)
+        return {key: batch.futures[key].result() for key in keys}
+
+    def _send(self, batch):
+        keys = list(batch.futures)
+        start = time.perf_counter()
+        try:
+            values = self.fetch(keys)
+        except BaseException as exc:
+            with self._lock:
+                self.errors += 1
+            for future in batch.futures.values():
+                future.set_exception(exc)
+            return
+        with self._lock:
+            self.batches += 1
+            self.keys += len(keys)
+            self._fetch_time += time.perf_counter() - start
+        for key, future in batch.futures.items():
+            future.set_result(values.get(key))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "batches": self.batches,
+                "keys": self.keys,
+                "errors": self.errors,
+                "avg_batch_size": self.keys / self.batches if self.batches else 0.0,
+                # upstream requests avoided by batching
+                "requests_saved": self.lookups - self.batches - self.errors,
+                "avg_fetch_time": self._fetch_time / self.batches if self.batches else 0.0,
+            }
+
+
+_batchers = {}
+
+
+def batcher_stats():
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
@@ -0,0 +1,183 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_MISSING = object()
+
+
+def _freeze(value):
+    # lists (e.g. currency pairs) and dicts become hashable, so they can be part of the key
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return tuple(sorted(_freeze(item) for item in value))
+    return value
+
+
+class ToolResultCache:
+    """Results of one tool, kept ``ttl`` seconds, with single-flight fetches.
+
+    Concurrent calls with the same arguments share one upstream fetch: the first caller runs the
+    tool, the others wait for its result (or its exception; failures are not cached). Results
+    rejected by ``cache_if`` (e.g. error messages returned by the tool) are shared the same way but
+    not cached either.
+    """
+
+    def __init__(self, name, ttl, max_size=1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expiry, result)
+        self._in_flight = {}  # key -> Future of the running fetch
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.expired = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def _get(self, key):
+        # with the lock held: the live result of ``key``, _MISSING if there is none
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            return _MISSING
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put(self, key, result):
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def lookup(self, key, default=None):
+        """The cached result of ``key``, for callers managing the fetch themselves (e.g. coroutines)."""
+        with self._lock:
+            result = self._get(key)
+            if result is _MISSING:
+                self.misses += 1
+                return default
+            return result
+
+    def store(self, key, result):
+        with self._lock:
+            self._put(key, result)
+
+    def call(self, fn, args, kwargs, cache_if=None):
+        key = (_freeze(args), _freeze(kwargs))
+        owner = False
+        with self._lock:
+            result = self._get(key)
+            if result is not _MISSING:
+                return result
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.shared += 1
+            else:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                owner = True
+        if not owner:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            with self._lock:
+                self.errors += 1
+                del self._in_flight[key]
+            future.set_exception(exc)
+            raise
+        try:
+            keep = cache_if is None or cache_if(result)
+        except Exception:
+            # a predicate failing on an unexpected result: the result is still returned, not cached
+            keep = False
+        try:
+            with self._lock:
+                if keep:
+                    self._put(key, result)
+                else:
+                    self.rejected += 1
+        finally:
+            # the waiting callers are always released, or every later identical call would block
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_result(result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            calls = self.hits + self.misses + self.shared
+            return {
+                "ttl": self.ttl,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                # calls that waited for an identical fetch in flight instead of making their own
+                "shared": self.shared,
+                "expired": self.expired,
+                "errors": self.errors,
+                # results not cached because ``cache_if`` rejected them
+                "rejected": self.rejected,
+                "upstream_saved": (self.hits + self.shared) / calls if calls else 0.0,
+            }
+
+
+_caches = {}
+
+
+def tool_cache(name, ttl, max_size=1024):
+    """A new ToolResultCache, listed in ``tool_cache_stats()``."""
+    cache = _caches[name] = ToolResultCache(name, ttl, max_size=max_size)
+    return cache
+
+
+def cached_tool(ttl, name=None, max_size=1024, cache_if=None):
+    """Caches the results of a tool function for ``ttl`` seconds, e.g. ``@cached_tool(ttl=30)`` for prices.
+
+    ``cache_if(result)`` tells whether a result may be cached: a tool that reports failures as
+    results, e.g. ``"Error: ..."`` strings, passes a predicate rejecting them so the next call
+    fetches again.
+
+    The arguments are bound to the signature of the function, so ``f("AAPL")`` and ``f(ticker="AAPL")``
+    share an entry; a tool whose arguments have several spellings (e.g. ticker case) normalizes them
+    before calling a cached helper.
+
+    The wrapper keeps the signature and docstring of the function, so it is described to the LLM
+    like the function itself.
+    """
+    def decorator(fn):
+        cache = tool_cache(name or fn.__name__, ttl, max_size=max_size)
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return cache.call(fn, bound.args, bound.kwargs, cache_if=cache_if)
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def set_tool_ttl(name, ttl):
+    """Changes the staleness policy of a cached tool; ``ttl=0`` disables its cache (fetches are still shared)."""
+    _caches[name].ttl = ttl
+
+
+def tool_cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
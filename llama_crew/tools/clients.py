@@ -0,0 +1,115 @@
+"""Clients shared by the network tools, so tool calls reuse open connections instead of paying a
+TCP and TLS handshake each time.
+
+- ``get_session()``: a requests Session with keep-alive connection pools and default timeouts.
+  The connection pools of urllib3 are thread-safe; the tools do not rely on the session cookies,
+  so the orchestrator worker threads share one session.
+- ``get_wikipedia(language, user_agent)``: one wikipediaapi client per language and user agent,
+  on the shared connection pools.
+- ``get_ddgs()``: one DDGS client per thread, it is not safe to share between threads.
+"""
+import inspect
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5.0, 30.0)  # (connect, read) seconds
+
+
+class PooledSession(requests.Session):
+    """requests Session applying ``timeout`` to the requests made without one."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def pooled_adapter(pool_connections=10, pool_maxsize=32, retries=2):
+    # idempotent requests failing to connect or with a 429/5xx are retried with backoff
+    retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET", "HEAD"),
+                  respect_retry_after_header=True, raise_on_status=False)
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+
+def mount_pools(session, **adapter_config):
+    adapter = pooled_adapter(**adapter_config)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_config = {"pool_connections": 10, "pool_maxsize": 32, "retries": 2, "timeout": DEFAULT_TIMEOUT}
+_session = None
+_wikipedia = {}
+_ddgs = threading.local()
+_lock = threading.Lock()
+
+
+def configure_http(**config):
+    """Sets the pool sizes, retries and timeout of the shared clients, e.g. ``configure_http(pool_maxsize=64, timeout=10)``.
+
+    The clients created before are closed, the next tool calls get new ones.
+    """
+    global _session
+    unknown = set(config) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown HTTP client settings: {sorted(unknown)}")
+    with _lock:
+        _config.update(config)
+        if _session is not None:
+            _session.close()
+        _session = None
+        _wikipedia.clear()
+
+
+def _adapter_config():
+    return {key: _config[key] for key in ("pool_connections", "pool_maxsize", "retries")}
+
+
+def get_session():
+    """The process-wide requests session of the tools."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = mount_pools(PooledSession(timeout=_config["timeout"]), **_adapter_config())
+        return _session
+
+
+def get_wikipedia(language="en", user_agent="llama-crew"):
+    """The shared wikipediaapi client of ``language``."""
+    import wikipediaapi
+    key = (language, user_agent)
+    with _lock:
+        client = _wikipedia.get(key)
+        if client is None:
+            if "user_agent" in inspect.signature(wikipediaapi.Wikipedia.__init__).parameters:
+                client = wikipediaapi.Wikipedia(user_agent=user_agent, language=language, timeout=_config["timeout"])
+            else:  # wikipediaapi < 0.6
+                client = wikipediaapi.Wikipedia(language, headers={"User-Agent": user_agent}, timeout=_config["timeout"])
+            # wikipediaapi keeps its own requests session: give it the pooled adapters
+            session = getattr(client, "_session", None)
+            if isinstance(session, requests.Session):
+                mount_pools(session, **_adapter_config())
+            _wikipedia[key] = client
+        return client
+
+
+def get_ddgs():
+    """The DDGS client of the calling thread."""
+    client = getattr(_ddgs, "client", None)
+    if client is None:
+        from duckduckgo_search import DDGS
+        client = _ddgs.client = DDGS(proxy=None, timeout=int(max(timeout_seconds(), 1)))
+    return client
+
+
+def timeout_seconds():
+    """The longest timeout of the shared settings, for clients taking a single number (DDGS, yfinance)."""
+    timeout = _config["timeout"]
+    return max(timeout) if isinstance(timeout, (tuple, list)) else timeout
@@ -0,0 +1,293 @@
+import atexit
+import contextlib
+import io
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+# imported once by every worker before its first snippet, so snippets do not pay for them
+DEFAULT_PRELOAD = ("math", "json", "re", "datetime", "collections", "itertools", "statistics", "random")
+
+
+class _CappedOutput(io.TextIOBase):
+    """stdout of a snippet: keeps the first ``limit`` characters and drops the rest."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        room = self.limit - self.size
+        if len(text) > room:
+            self.truncated = True
+            text = text[:max(room, 0)]
+        if text:
+            self.parts.append(text)
+            self.size += len(text)
+        return len(text)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+def _limit_memory(memory_limit):
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _worker_main(conn, memory_limit, max_output, preload):
+    for module in preload:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    if memory_limit:
+        _limit_memory(memory_limit)
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            return
+        if code is None:
+            return
+        output = _CappedOutput(max_output)
+        error = None
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                # every snippet gets fresh globals, nothing leaks from one call to the next
+                exec(code, {"__name__": "__main__"})
+        except MemoryError:
+            error = "MemoryError: the code exceeded the memory limit"
+        except BaseException as exc:
+            error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        try:
+            conn.send({"output": output.getvalue(), "truncated": output.truncated, "error": error,
+                       "duration": time.perf_counter() - start, "recycle": error is not None and error.startswith("MemoryError")})
+        except (BrokenPipeError, OSError):
+            return
+
+
+class _Worker:
+    def __init__(self, context, memory_limit, max_output, preload):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, memory_limit, max_output, preload), daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+
+    def stop(self, timeout=1.0):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class CodePool:
+    """Pool of pre-started interpreter processes running the snippets of the `repl` tool.
+
+    Each snippet runs in a worker process with its own stdout, so concurrent snippets neither mix
+    their output nor hold the GIL of the orchestrator.
+
+    Args:
+        workers (int): number of worker processes, started with the pool.
+        timeout (float): wall-clock seconds a snippet may run; the worker is killed and replaced after.
+        memory_limit (int): address space limit of a worker in bytes (RLIMIT_AS), None for no limit.
+        max_output (int): characters of output returned, the rest is dropped.
+        max_tasks_per_worker (int): snippets run by a worker before it is replaced by a fresh one.
+        preload (tuple): modules imported by the workers when they start.
+        start_method (str): multiprocessing start method; forkserver by default where available,
+            since forking the threaded orchestrator process is not safe.
+    """
+
+    def __init__(self, workers=4, timeout=30.0, memory_limit=1024 * 1024 * 1024, max_output=20000, max_tasks_per_worker=100,
+                 preload=DEFAULT_PRELOAD, start_method=None):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.context = multiprocessing.get_context(start_method)
+        self.size = workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_output = max_output
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.preload = tuple(preload)
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.truncated = 0
+        self.recycled = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._total_run_time = 0.0
+        for _ in range(workers):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        worker = _Worker(self.context, self.memory_limit, self.max_output, self.preload)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker, graceful=True):
+        with self._lock:
+            self._workers.discard(worker)
+            self.recycled += 1
+        worker.stop() if graceful else worker.kill()
+        if not self._closed:
+            self._idle.put(self._start_worker())
+
+    def _format(self, result):
+        output = result["output"]
+        if result["truncated"]:
+            output += f"\n... [output truncated at {self.max_output} characters]"
+        if result["error"]:
+            output += ("\n" if output else "") + result["error"]
+        return output
+
+    def run(self, code):
+        """Runs ``code`` in a worker and returns its output (with the error, if it raised)."""
+        if self._closed:
+            raise RuntimeError("the code pool is shut down")
+        queued = time.perf_counter()
+        worker = self._idle.get()
+        started = time.perf_counter()
+        try:
+            worker.conn.send(code)
+            finished = worker.conn.poll(self.timeout)
+            result = worker.conn.recv() if finished else None
+        except (EOFError, BrokenPipeError, OSError):
+            # the worker died, e.g. killed by the OS
+            result = {"output": "", "truncated": False, "error": "Error: the worker running the code exited", "recycle": True}
+            finished = True
+        run_time = time.perf_counter() - started
+        with self._lock:
+            self.calls += 1
+            self._total_queue_wait += started - queued
+            self._max_queue_wait = max(self._max_queue_wait, started - queued)
+            self._total_run_time += run_time
+            if not finished:
+                self.timeouts += 1
+            elif result["error"]:
+                self.errors += 1
+            if finished and result["truncated"]:
+                self.truncated += 1
+        if not finished:
+            # a running snippet cannot be interrupted, its process is killed
+            self._replace(worker, graceful=False)
+            return f"Error: the code did not finish within {self.timeout} seconds"
+        worker.tasks += 1
+        if result.get("recycle") or worker.tasks >= self.max_tasks_per_worker:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+        return self._format(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.size,
+                "calls": self.calls,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "truncated": self.truncated,
+                "recycled": self.recycled,
+                "idle": self._idle.qsize(),
+                # time spent waiting for a free worker, apart from the time spent running the code
+                "avg_queue_wait": self._total_queue_wait / self.calls if self.calls else 0.0,
+                "max_queue_wait": self._max_queue_wait,
+                "avg_run_time": self._total_run_time / self.calls if self.calls else 0.0,
+            }
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_config = {}
+_pool_lock = threading.Lock()
+
+
+def get_code_pool():
+    """The process-wide pool, started with its workers on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CodePool(**_pool_config)
+        return _pool
+
+
+def configure_code_pool(**kwargs):
+    """Sets the settings of the process-wide pool, e.g. ``configure_code_pool(workers=8, timeout=10)``.
+
+    A running pool is shut down; the next snippet starts a pool with the new settings.
+    """
+    global _pool
+    with _pool_lock:
+        _pool_config.clear()
+        _pool_config.update(kwargs)
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def code_pool_stats():
+    """Statistics of the process-wide pool, None if it has not been started."""
+    return _pool.stats() if _pool is not None else None
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown()
+
+
+def build_repl_tool(workers=4, timeout=30.0, memory_mb=1024, max_output=20000, max_tasks_per_worker=100, preload=DEFAULT_PRELOAD,
+                    description=None, warm_start=True):
+    """Configures the process-wide code pool and returns the `repl` tool running on it; used from tools.yaml through ``params``.
+
+    The tool is built with the agent using it, so runs without such an agent do not start the pool.
+    With ``warm_start`` the worker processes are started in the background right away, instead of
+    by the first snippet.
+    """
+    configure_code_pool(workers=workers, timeout=timeout, memory_limit=memory_mb * 1024 * 1024 if memory_mb else None,
+                               max_output=max_output, max_tasks_per_worker=max_tasks_per_worker, preload=preload)
+    if warm_start:
+        # a snippet arriving before the workers are up waits for them in get_code_pool
+        threading.Thread(target=get_code_pool, name="code-pool-warm-start", daemon=True).start()
+
+    def repl(code: str) -> str:
+        """Execute python code and returns the stdout. Code needs to print the output."""
+        output = get_code_pool().run(code)
+        print("Output:", output)
+        print("Code:", code)
+        return output
+    if description:
+        repl.__doc__ = description
+    return repl
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+MANIFEST_FILE = "manifest.json"
+NODES_DIR = "nodes"
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentNodeStore:
+    """On-disk store of the chunked nodes of each source file, keyed by the hash of its content.
+
+    Unchanged files are loaded from disk without being re-read or re-split; only new or
+    modified files go through the reader and the splitter.
+
+    Layout of ``persist_dir``::
+
+        manifest.json       source path -> {mtime, size, key}
+        nodes/<key>.json    serialized nodes of one source file
+    """
+
+    def __init__(self, persist_dir, chunk_size=1024, chunk_overlap=200, verbose=False):
+        self.persist_dir = persist_dir
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        os.makedirs(os.path.join(persist_dir, NODES_DIR), exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        path = os.path.join(self.persist_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as file:
+            return json.load(file)
+
+    def _write_manifest(self):
+        path = os.path.join(self.persist_dir, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._manifest, file, indent=2)
+        os.replace(tmp_path, path)
+
+    def _nodes_path(self, key):
+        return os.path.join(self.persist_dir, NODES_DIR, f"{key}.json")
+
+    def content_key(self, path):
+        # the splitter settings are part of the key, changing them re-chunks every file
+        return f"{file_hash(path)[:32]}-{self.chunk_size}-{self.chunk_overlap}"
+
+    def _parse(self, path, key):
+        if self.verbose:
+            print(f"Indexing {path}")
+        documents = SimpleDirectoryReader(input_files=[path], filename_as_id=True).load_data()
+        nodes = self._splitter.get_nodes_from_documents(documents)
+        tmp_path = self._nodes_path(key) + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump([doc_to_json(node) for node in nodes], file)
+        os.replace(tmp_path, self._nodes_path(key))
+        return nodes
+
+    def _load(self, key):
+        with open(self._nodes_path(key), "r") as file:
+            return [json_to_doc(node) for node in json.load(file)]
+
+    def _resolve_key(self, path):
+        stat = os.stat(path)
+        entry = self._manifest.get(path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["key"]
+        key = self.content_key(path)
+        if entry is not None and entry["key"] != key:
+            self._discard(path, entry["key"])
+        self._manifest[path] = {"mtime": stat.st_mtime, "size": stat.st_size, "key": key}
+        return key
+
+    def _discard(self, path, key):
+        still_used = any(entry["key"] == key for other, entry in self._manifest.items() if other != path)
+        if not still_used and os.path.exists(self._nodes_path(key)):
+            os.remove(self._nodes_path(key))
+
+    def get_nodes(self, path):
+        """Returns the nodes of one source file, parsing it only if its content changed."""
+        return self.get_nodes_with_key(path)[1]
+
+    def get_nodes_with_key(self, path):
+        """Same as ``get_nodes``, also returning the content key of the file."""
+        path = os.path.abspath(path)
+        with self._lock:
+            key = self._resolve_key(path)
+            # keys are content hashes, an existing nodes file is always up to date
+            if os.path.exists(self._nodes_path(key)):
+                nodes = self._load(key)
+            else:
+                nodes = self._parse(path, key)
+            self._write_manifest()
+        return key, nodes
+
+    def get_all_nodes(self, paths):
+        nodes = []
+        for path in paths:
+            nodes.extend(self.get_nodes(path))
+        return nodes
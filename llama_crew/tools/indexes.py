@@ -1,24 +1,92 @@
-from llama_index.core import SummaryIndex
+import glob
+import os
+
+from llama_index.core import Settings, SummaryIndex
 from llama_index.core.tools import QueryEngineTool
-from llama_index.core import SimpleDirectoryReader
-from llama_index.core.node_parser import SentenceSplitter
-
-# load documents
-documents = SimpleDirectoryReader(input_files=["data/metagpt.pdf"]).load_data()
-
-splitter = SentenceSplitter(chunk_size=1024)
-nodes = splitter.get_nodes_from_documents(documents)
-
-summary_index = SummaryIndex(nodes)
-summary_query_engine = summary_index.as_query_engine(
-    response_mode="tree_summarize",
-    use_async=True,
-)
-
-summary_tool = QueryEngineTool.from_defaults(
-    name="summary_tool",
-    query_engine=summary_query_engine,
-    description=(
-        "Useful if you want to get a summary of MetaGPT"
-    ),
-)
\ No newline at end of file
+from .index_store import DocumentNodeStore
+from .lazy import LazyQueryEngine
+from .summary_tree import HierarchicalSummaryQueryEngine, SummaryTreeStore
+
+DEFAULT_SOURCES = ["data/metagpt.pdf"]
+DEFAULT_PERSIST_DIR = "storage/summary_index"
+
+
+def expand_sources(sources):
+    # entries can be files, directories or glob patterns
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            source = os.path.join(source, "**", "*")
+        matches = sorted(glob.glob(source, recursive=True)) if glob.has_magic(source) else [source]
+        paths.extend(path for path in matches if os.path.isfile(path))
+    return paths
+
+
+def build_summary_trees(sources=DEFAULT_SOURCES, persist_dir=DEFAULT_PERSIST_DIR, chunk_size=1024, branching=8, llm=None, verbose=False):
+    # build-time stage: one cached summary tree per document, only (re)built when the document changes
+    store = DocumentNodeStore(persist_dir, chunk_size=chunk_size, verbose=verbose)
+    tree_store = SummaryTreeStore(persist_dir, branching=branching)
+    llm = llm or Settings.llm
+    trees = []
+    for path in expand_sources(sources):
+        key, nodes = store.get_nodes_with_key(path)
+        trees.append(tree_store.get_tree(key, path, nodes, llm, verbose=verbose))
+    return trees
+
+
+def build_summary_query_engine(sources=DEFAULT_SOURCES, persist_dir=DEFAULT_PERSIST_DIR, chunk_size=1024,
+                               response_mode="tree_summarize", branching=8, descend_k=3, verbose=False):
+    if response_mode == "hierarchical":
+        trees = build_summary_trees(sources, persist_dir=persist_dir, chunk_size=chunk_size, branching=branching, verbose=verbose)
+        return HierarchicalSummaryQueryEngine(trees=trees, llm=Settings.llm, descend_k=descend_k, verbose=verbose)
+
+    # unchanged documents are loaded from the node store, only new or modified ones are re-chunked
+    store = DocumentNodeStore(persist_dir, chunk_size=chunk_size, verbose=verbose)
+    nodes = store.get_all_nodes(expand_sources(sources))
+
+    summary_index = SummaryIndex(nodes)
+    return summary_index.as_query_engine(
+        response_mode=response_mode,
+        use_async=True,
+    )
+
+
+def build_summary_tool(name="summary_tool", description="Useful if you want to get a summary of MetaGPT",
+                       sources=DEFAULT_SOURCES, persist_dir=DEFAULT_PERSIST_DIR, chunk_size=1024,
+                       response_mode="tree_summarize", branching=8, descend_k=3, verbose=False):
+    """Builds a summary tool over ``sources``; used from tools.yaml through ``params``.
+
+    The documents are only read and indexed on the first query. With ``response_mode: hierarchical``
+    queries are answered from precomputed summary trees with a single LLM call.
+    """
+    query_engine = LazyQueryEngine(
+        lambda: build_summary_query_engine(sources, persist_dir=persist_dir, chunk_size=chunk_size,
+                                           response_mode=response_mode, branching=branching,
+                                           descend_k=descend_k, verbose=verbose)
+    )
+    return QueryEngineTool.from_defaults(
+        name=name,
+        query_engine=query_engine,
+        description=description,
+    )
+
+
+summary_tool = build_summary_tool()
+
+
+if __name__ == "__main__":
+    import argparse
+    import yaml
+
+    parser = argparse.ArgumentParser(description='Precompute the summary trees of the hierarchical summary tools')
+    parser.add_argument('--tools_config', type=str, default='tools.yaml', help='Path to the tools configuration file')
+    args = parser.parse_args()
+
+    with open(args.tools_config, 'r') as file:
+        tools_config = yaml.safe_load(file)
+    for tool in tools_config["tools"]:
+        params = tool.get("params") or {}
+        if tool["module"] == __spec__.name and params.get("response_mode") == "hierarchical":
+            print(f"Building summary trees for {tool['name']}")
+            build_summary_trees(params.get("sources", DEFAULT_SOURCES), persist_dir=params.get("persist_dir", DEFAULT_PERSIST_DIR),
+                                chunk_size=params.get("chunk_size", 1024), branching=params.get("branching", 8), verbose=True)
@@ -0,0 +1,141 @@
+import ast
+import importlib.util
+import inspect
+import threading
+import typing
+
+# Names an annotation may refer to when it is evaluated from source without importing the tool module.
+_ANNOTATION_NAMESPACE = {
+    "__builtins__": {},
+    "str": str, "int": int, "float": float, "bool": bool, "bytes": bytes,
+    "list": list, "dict": dict, "tuple": tuple, "set": set,
+    "Any": typing.Any, "List": typing.List, "Dict": typing.Dict, "Tuple": typing.Tuple,
+    "Optional": typing.Optional, "Union": typing.Union,
+}
+
+
+def _eval_annotation(node):
+    if node is None:
+        return inspect.Parameter.empty
+    try:
+        return eval(compile(ast.Expression(node), "<annotation>", "eval"), _ANNOTATION_NAMESPACE)
+    except Exception:
+        # Unknown names (e.g. types from the tool module itself) are left unannotated.
+        return inspect.Parameter.empty
+
+
+def _signature_from_ast(node):
+    args = node.args
+    parameters = []
+    positional = args.posonlyargs + args.args
+    defaults = [inspect.Parameter.empty] * (len(positional) - len(args.defaults)) + [ast.literal_eval(d) for d in args.defaults]
+    for i, (arg, default) in enumerate(zip(positional, defaults)):
+        kind = inspect.Parameter.POSITIONAL_ONLY if i < len(args.posonlyargs) else inspect.Parameter.POSITIONAL_OR_KEYWORD
+        parameters.append(inspect.Parameter(arg.arg, kind, default=default, annotation=_eval_annotation(arg.annotation)))
+    if args.vararg is not None:
+        parameters.append(inspect.Parameter(args.vararg.arg, inspect.Parameter.VAR_POSITIONAL, annotation=_eval_annotation(args.vararg.annotation)))
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        default = inspect.Parameter.empty if default is None else ast.literal_eval(default)
+        parameters.append(inspect.Parameter(arg.arg, inspect.Parameter.KEYWORD_ONLY, default=default, annotation=_eval_annotation(arg.annotation)))
+    if args.kwarg is not None:
+        parameters.append(inspect.Parameter(args.kwarg.arg, inspect.Parameter.VAR_KEYWORD, annotation=_eval_annotation(args.kwarg.annotation)))
+    return inspect.Signature(parameters, return_annotation=_eval_annotation(node.returns))
+
+
+def read_function_metadata(module_name, function_name):
+    """Reads the docstring and signature of a module level function from its source, without importing the module.
+
+    Decorators are assumed to preserve the signature (``functools.wraps``).
+
+    Returns:
+        tuple: ``(docstring, signature)``, or None when the function can't be described statically
+        (not a plain ``def``, non-literal defaults, module not found, ...).
+    """
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        return None
+    with open(spec.origin, "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=spec.origin)
+    found = None
+    for statement in tree.body:
+        # the last binding of the name wins, as it would at import time
+        if isinstance(statement, ast.FunctionDef) and statement.name == function_name:
+            found = statement
+        elif isinstance(statement, (ast.AsyncFunctionDef, ast.ClassDef)) and statement.name == function_name:
+            found = None
+        elif isinstance(statement, (ast.Assign, ast.AnnAssign)):
+            targets = statement.targets if isinstance(statement, ast.Assign) else [statement.target]
+            if any(isinstance(t, ast.Name) and t.id == function_name for t in targets):
+                found = None
+    if found is None:
+        return None
+    try:
+        signature = _signature_from_ast(found)
+    except ValueError:
+        return None
+    return ast.get_docstring(found, clean=False), signature
+
+
+class LazyFunction:
+    """Callable stand-in for a tool function that is only imported on its first call.
+
+    It carries ``__name__``, ``__doc__`` and ``__signature__`` so ``FunctionTool.from_defaults``
+    can build the tool schema from it as if it were the real function.
+    """
+
+    def __init__(self, loader, name, doc, signature, module=None):
+        self._loader = loader
+        self._target = None
+        self._lock = threading.Lock()
+        self.__name__ = name
+        self.__qualname__ = name
+        self.__doc__ = doc
+        self.__signature__ = signature
+        self.__module__ = module
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._loader()
+        return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "deferred"
+        return f"<LazyFunction {self.__module__}.{self.__name__} ({state})>"
+
+
+class LazyQueryEngine:
+    """Query engine proxy that builds the wrapped engine (and its index) on the first query."""
+
+    def __init__(self, build_fn):
+        self._build_fn = build_fn
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._engine is not None
+
+    def resolve(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._build_fn()
+        return self._engine
+
+    def query(self, query):
+        return self.resolve().query(query)
+
+    async def aquery(self, query):
+        return await self.resolve().aquery(query)
@@ -20,59 +20,6 @@ def human_input(query:str) -> str:
     """Prompts the user for input."""
     return input(query)
 
-import sys
-import io
-
-class CodeExecutor:
-    def __init__(self):
-        pass
-    
-    def execute_code(self, code):
-        try:
-            # Redirect stdout to capture print outputs
-            old_stdout = sys.stdout
-            new_stdout = io.StringIO()
-            sys.stdout = new_stdout
-            
-            # Compile and execute the code
-            exec(code)
-            
-            # Get the output
-            output = new_stdout.getvalue()
-            print("Output:", output)
-            # Restore stdout
-            sys.stdout = old_stdout
-            
-            return output
-        except Exception as e:
-            return str(e)
-
-# Sample usage
-# code_executor = CodeExecutor()
-# sample_code = """
-# def fibonacci(n):
-#     if n <= 1:
-#         return n
-#     else:
-#         return fibonacci(n-1) + fibonacci(n-2)
-
-# result = fibonacci(12)
-# print(result)
-# """
-# output = code_executor.execute_code(sample_code)
-# print("Output:", output)
-
-def repl(code:str) -> str:
-    """Execute python code and returns the stdout. Code needs to print the output."""
-    code_executor = CodeExecutor()
-    output = code_executor.execute_code(code)
-    print("Output:", output)
-    print("Code:", code)
-    return output
-
-
-import wikipediaapi
-
 def get_wikipedia_summary(page_title: str, language: str = 'en') -> str:
     """Fetches the summary from a Wikipedia page.
     
@@ -83,7 +30,8 @@ def get_wikipedia_summary(page_title: str, language: str = 'en') -> str:
     Returns:
         str: The summary of the Wikipedia page if found, else an error message.
     """
-    wiki_wiki = wikipediaapi.Wikipedia(language, headers = {'User-Agent': 'MyCoolBot'})
+    from .clients import get_wikipedia
+    wiki_wiki = get_wikipedia(language, user_agent='MyCoolBot')
     page = wiki_wiki.page(page_title)
 
     if page.exists():
@@ -101,18 +49,26 @@ def get_wikipedia_page(page_title: str, language: str = 'en') -> str:
     Returns:
         str: The page of the Wikipedia page if found, else an error message.
     """
-    wiki_wiki = wikipediaapi.Wikipedia(language, headers = {'User-Agent': 'MyCoolBot/0.0 (https://example.org/coolbot/; coolbot@example.org)'})
-    page = wiki_wiki.page(page_title)
-
-    if page.exists():
-        return page.text
+    # pages are kept in the local page store, they are not downloaded again on every call
+    from .wiki_store import WikipediaUnreachable, fetch_page
+    try:
+        page = fetch_page(page_title, language, user_agent='MyCoolBot/0.0 (https://example.org/coolbot/; coolbot@example.org)')
+    except WikipediaUnreachable:
+        return f"Error: Wikipedia could not be reached and the page '{page_title}' is not stored locally."
+
+    if page is not None:
+        return page[1]
     else:
         return f"The page '{page_title}' does not exist on Wikipedia in the '{language}' language."
 
 
-import requests
 import json
+from .batching import MicroBatcher
+from .cache import cached_tool
 
+# market data is cached briefly: agents of the same step group often ask for the same prices;
+# error messages are not cached, the next call asks again
+@cached_tool(ttl=60, cache_if=lambda result: not result.startswith("Error:"))
 def get_top_cryptocurrencies(currency='usd', limit=10):
     """Fetches top cryptocurrencies by price, volume, and market cap from CoinGecko.
     
@@ -123,6 +79,7 @@ def get_top_cryptocurrencies(currency='usd', limit=10):
     Returns:
         list: A list of dictionaries containing cryptocurrency data.
     """
+    from .clients import get_session
     url = 'https://api.coingecko.com/api/v3/coins/markets'
     params = {
         'vs_currency': currency,
@@ -131,14 +88,51 @@ def get_top_cryptocurrencies(currency='usd', limit=10):
         'page': 1,
         'sparkline': 'false'
     }
-    response = requests.get(url, params=params)
+    response = get_session().get(url, params=params)
     
     if response.status_code == 200:
         return json.dumps(response.json())
     else:
         return f"Error: Unable to fetch data, received status code {response.status_code}"
     
-import yfinance as yf
+def download_closes(tickers):
+    """Last close of each ticker (stocks or currency pairs), fetched with one yf.download call."""
+    import yfinance as yf
+    from .clients import timeout_seconds
+    # a hung download would hold its worker thread past the step deadline: it gets the HTTP timeout of the tools
+    data = yf.download(tickers, period='1d', interval='1d', progress=False, timeout=timeout_seconds())
+    closes = data['Close']
+    if not hasattr(closes, 'columns'):
+        # a single ticker without a column level
+        closes = closes.to_frame(tickers[0])
+    last = {}
+    for ticker in tickers:
+        if ticker in closes.columns:
+            values = closes[ticker].dropna()
+            if len(values):
+                last[ticker] = float(values.iloc[-1])
+    return last
+
+
+# ticker lookups of concurrent agents arriving within 50 ms share one yf.download
+close_batcher = MicroBatcher(download_closes, window=0.05, max_batch=50, name='yfinance_close')
+
+
+def _normalize_ticker(ticker):
+    # yf.download returns its columns upper case: the batch and cache keys are normalized the same way
+    return ticker.strip().upper()
+
+
+# cached by normalized ticker, so "aapl" and "AAPL" share an entry; missing prices are not cached
+@cached_tool(ttl=30, name='get_stock_price', cache_if=lambda price: price is not None)
+def _last_close(ticker):
+    return close_batcher.get(ticker)
+
+
+@cached_tool(ttl=30, name='get_forex_exchange_rates', cache_if=lambda rates: None not in rates.values())
+def _last_closes(tickers):
+    return close_batcher.get_many(list(tickers))
+
 
 def get_stock_price(ticker: str):
     """Fetches the stock price of a given ticker symbol.
@@ -149,9 +143,9 @@ def get_stock_price(ticker: str):
     Returns:
         float: The current stock price if available, else an error message.
     """
-    stock = yf.Ticker(ticker)
-    current_price = stock.history(period='1d')['Close'][-1]
-    
+    current_price = _last_close(_normalize_ticker(ticker))
+    if current_price is None:
+        return f"No price data for '{ticker}'"
     return current_price
 
 
@@ -164,16 +158,7 @@ def get_forex_exchange_rates(pairs: list):
     Returns:
         dict: A dictionary containing exchange rates.
     """
-    data = yf.download(pairs, period='1d', interval='1d')
-    exchange_rates = {}
-    
-    for pair in pairs:
-        try:
-            if len(pairs) == 1:
-                exchange_rates[pair] = data['Close'].iloc[-1]
-            else:
-                exchange_rates[pair] = data['Close'][pair].iloc[-1]
-        except KeyError:
-            exchange_rates[pair] = 'Data not available'
-    
-    return exchange_rates
+    rates = _last_closes(sorted({_normalize_ticker(pair) for pair in pairs}))
+    # keyed by the pairs as the caller wrote them
+    rates = {pair: rates[_normalize_ticker(pair)] for pair in pairs}
+    return {pair: 'Data not available' if rates[pair] is None else rates[pair] for pair in pairs}
@@ -1,12 +1,131 @@
+import asyncio
+import contextlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from urllib.parse import urlsplit
 
-from duckduckgo_search import DDGS
+from .cache import tool_cache
+from .clients import get_ddgs, timeout_seconds
 
 def search_ddg(query: str) -> str:
     "Search online and return the results."
-    return DDGS(proxy=None).text(query, max_results=3)
+    return get_ddgs().text(query, max_results=3)
+
+
+# results of a query stay valid 15 minutes, keyed by the normalized query
+_query_cache = tool_cache("search_web", ttl=900)
+_loop_runner = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search-web")
+
+
+def normalize_query(query):
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def normalize_url(url):
+    parts = urlsplit(url or "")
+    host = parts.netloc.lower().removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{parts.query}" if parts.query else "")
+
+
+def _async_client():
+    """An AsyncDDGS client, None where duckduckgo_search has none (version 7 dropped it)."""
+    try:
+        from duckduckgo_search import AsyncDDGS
+    except ImportError:
+        return None
+    return AsyncDDGS(proxy=None, timeout=int(max(timeout_seconds(), 1)))
+
+
+async def _fetch(client, query, max_results):
+    if client is None:
+        return await asyncio.to_thread(lambda: get_ddgs().text(query, max_results=max_results))
+    return await client.atext(query, max_results=max_results)
+
+
+async def asearch_queries(queries, max_results=5, max_concurrency=4):
+    """Results of every query (a list of DDGS result dicts, or the exception of a failed query).
+
+    Queries are cached and deduplicated by their normalized form, but searched as written: the
+    first spelling of a query is sent to the search engine and keys its results. The queries of a
+    call share one client, closed when they are done.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def search(key, query):
+        results = _query_cache.lookup(key)
+        if results is not None:
+            return results
+        async with semaphore:
+            results = await _fetch(client, query, max_results)
+        _query_cache.store(key, results)
+        return results
+
+    # the same query written twice is searched once
+    unique = {}
+    for query in queries:
+        normalized = normalize_query(query)
+        if normalized and normalized not in unique:
+            unique[normalized] = query.strip()
+    async with contextlib.AsyncExitStack() as stack:
+        client = _async_client()
+        if client is not None:
+            await stack.enter_async_context(client)
+        results = await asyncio.gather(*(search((normalized, max_results), query) for normalized, query in unique.items()),
+                                       return_exceptions=True)
+    return dict(zip(unique.values(), results))
+
+
+def rank_results(results_by_query, top_k=8, k=60):
+    """Merges the results of the queries by URL, ranked by reciprocal rank fusion: a page found
+    by several queries, or high in their results, comes first."""
+    merged = {}
+    for results in results_by_query.values():
+        if isinstance(results, BaseException):
+            continue
+        for rank, result in enumerate(results or []):
+            url = normalize_url(result.get("href"))
+            if not url:
+                continue
+            entry = merged.setdefault(url, {"result": result, "score": 0.0, "queries": 0})
+            entry["score"] += 1.0 / (k + rank + 1)
+            entry["queries"] += 1
+    ranked = sorted(merged.values(), key=lambda entry: entry["score"], reverse=True)
+    return [entry["result"] for entry in ranked[:top_k]]
+
+
+def _run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # called from a running loop (async agents): run the searches on a loop of their own
+    return _loop_runner.submit(asyncio.run, coroutine).result()
+
+
+def search_web(queries: List[str], max_results: int = 5) -> str:
+    """Searches the web for several queries at once and returns one ranked list of results without duplicates.
+
+    Args:
+        queries (List[str]): the search queries, e.g. different phrasings or aspects of the question.
+        max_results (int): results fetched per query.
+
+    Returns:
+        str: numbered results with their title, URL and snippet.
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    results_by_query = _run(asearch_queries(queries, max_results=max_results))
+    ranked = rank_results(results_by_query)
+    failed = [query for query, results in results_by_query.items() if isinstance(results, BaseException)]
+    lines = [f"{i}. {result.get('title', '')} - {result.get('href', '')}\n   {(result.get('body') or '')[:200]}"
+             for i, result in enumerate(ranked, 1)]
+    if failed:
+        lines.append(f"(search failed for: {', '.join(failed)})")
+    return "\n".join(lines) if lines else "No results found."
 
 
 if __name__ == "__main__":
     word = "python"
     results = search_ddg(word)
-    print(results)
\ No newline at end of file
+    print(results)
@@ -0,0 +1,140 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.query_engine import CustomQueryEngine
+from llama_crew.retrieval import BM25
+
+SUMMARIZE_PROMPT = (
+    "The following passages are consecutive parts of the document '{source}'.\n\n"
+    "{passages}\n\n"
+    "Write a dense summary of these passages. Keep the key facts, names, numbers and conclusions."
+)
+
+ANSWER_PROMPT = (
+    "The following summaries describe one or more documents, from the most general (level {top_level}) "
+    "to the most detailed (level 0, original text):\n\n"
+    "{context}\n\n"
+    "Using only this information, answer the query: {query}"
+)
+
+
+class SummaryTree:
+    """Summary tree of one document: the chunks are the leaves (level 0) and every upper
+    node is an LLM summary of up to ``branching`` nodes of the level below."""
+
+    def __init__(self, source, nodes):
+        self.source = source
+        # each node: {"text": str, "level": int, "children": [node index, ...]}
+        self.nodes = nodes
+
+    @property
+    def depth(self):
+        return max((node["level"] for node in self.nodes), default=0)
+
+    @property
+    def root_ids(self):
+        return [i for i, node in enumerate(self.nodes) if node["level"] == self.depth]
+
+    @classmethod
+    def build(cls, source, texts, llm, branching=8, max_workers=4, verbose=False):
+        nodes = [{"text": text, "level": 0, "children": []} for text in texts]
+        level_ids = list(range(len(nodes)))
+        level = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(level_ids) > 1:
+                level += 1
+                groups = [level_ids[i:i + branching] for i in range(0, len(level_ids), branching)]
+                if verbose:
+                    print(f"Summarizing {source}: level {level}, {len(groups)} nodes")
+                prompts = [
+                    SUMMARIZE_PROMPT.format(source=source, passages="\n\n".join(nodes[i]["text"] for i in group))
+                    for group in groups
+                ]
+                summaries = executor.map(lambda prompt: str(llm.complete(prompt)), prompts)
+                level_ids = []
+                for group, summary in zip(groups, summaries):
+                    nodes.append({"text": summary, "level": level, "children": group})
+                    level_ids.append(len(nodes) - 1)
+        return cls(source, nodes)
+
+    def to_dict(self):
+        return {"source": self.source, "nodes": self.nodes}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["source"], data["nodes"])
+
+
+class SummaryTreeStore:
+    """Caches the summary trees on disk, keyed by the content key of the source document."""
+
+    def __init__(self, persist_dir, branching=8):
+        self.tree_dir = os.path.join(persist_dir, "trees")
+        self.branching = branching
+        os.makedirs(self.tree_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.tree_dir, f"{key}-b{self.branching}.json")
+
+    def get_tree(self, key, source, nodes, llm, verbose=False):
+        path = self._path(key)
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                return SummaryTree.from_dict(json.load(file))
+        texts = [node.get_content() for node in nodes]
+        tree = SummaryTree.build(source, texts, llm, branching=self.branching, verbose=verbose)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(tree.to_dict(), file)
+        os.replace(tmp_path, path)
+        return tree
+
+
+class HierarchicalSummaryQueryEngine(CustomQueryEngine):
+    """Answers from the cached upper levels of the summary trees with a single LLM call.
+
+    The roots of the trees are always in the context. From there, only the ``descend_k`` children
+    that best match the query are added at each level, until nothing below matches the query.
+    """
+
+    trees: List[Any] = Field(default_factory=list)
+    llm: Any = Field(default=None)
+    descend_k: int = Field(default=3)
+    max_roots: int = Field(default=5)
+    verbose: bool = Field(default=False)
+
+    def select_context(self, query_str):
+        roots = [(tree, i) for tree in self.trees for i in tree.root_ids]
+        if len(roots) > self.max_roots:
+            ranked = BM25([tree.nodes[i]["text"] for tree, i in roots]).top_k(query_str, self.max_roots)
+            roots = [roots[i] for i, _ in ranked] or roots[:self.max_roots]
+        context = list(roots)
+        frontier = roots
+        while frontier:
+            children = [(tree, child) for tree, i in frontier for child in tree.nodes[i]["children"]]
+            if not children:
+                break
+            ranked = BM25([tree.nodes[i]["text"] for tree, i in children]).top_k(query_str, self.descend_k)
+            # nothing below matches the query, the upper levels are enough to answer it
+            if not ranked:
+                break
+            frontier = [children[i] for i, _ in ranked]
+            context.extend(frontier)
+        return context
+
+    def _prompt(self, query_str):
+        context = self.select_context(query_str)
+        if self.verbose:
+            print(f"Answering from {len(context)} summary nodes")
+        top_level = max((tree.nodes[i]["level"] for tree, i in context), default=0)
+        sections = [f"[{tree.source} | level {tree.nodes[i]['level']}]\n{tree.nodes[i]['text']}" for tree, i in context]
+        return ANSWER_PROMPT.format(top_level=top_level, context="\n\n".join(sections), query=query_str)
+
+    def custom_query(self, query_str: str) -> str:
+        return str(self.llm.complete(self._prompt(query_str)))
+
+    async def acustom_query(self, query_str: str) -> str:
+        return str(await self.llm.acomplete(self._prompt(query_str)))
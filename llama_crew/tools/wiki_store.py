@@ -0,0 +1,337 @@
+"""Local store of Wikipedia pages and passage-level retrieval over them.
+
+Pages are kept zlib-compressed in a SQLite file, keyed by (language, title, revision), so a page is
+downloaded once and then read locally; the store can also be filled in bulk from a dump to work
+offline:
+
+    python -m llama_crew.tools.wiki_store load enwiki-pages-articles.xml.bz2 --language en
+    python -m llama_crew.tools.wiki_store load pages.jsonl --language en   # {"title", "text", "revid"} lines
+"""
+import bz2
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from xml.etree import ElementTree
+
+import requests
+
+from llama_crew.retrieval import BM25
+
+DEFAULT_PATH = "storage/wikipedia/pages.sqlite"
+# a page newer than this is not fetched again
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+# Wikipedia asks API clients for a descriptive user agent with contact information
+USER_AGENT = "MyCoolBot/0.0 (https://example.org/coolbot/; coolbot@example.org)"
+_HEADING_RE = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$")
+
+
+def normalize_title(title):
+    title = " ".join(title.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+def _open(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def strip_wikitext(text):
+    """Plain text of wikitext from a dump: templates, references, tables and link markup removed."""
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
+    text = re.sub(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>", "", text, flags=re.DOTALL)
+    # innermost templates first, until nested ones are gone
+    previous = None
+    while previous != text:
+        previous = text
+        text = re.sub(r"\{\{[^{}]*\}\}", "", text)
+    text = re.sub(r"\{\|.*?\|\}", "", text, flags=re.DOTALL)
+    text = re.sub(r"\[\[(?:File|Image|Category):[^\]]*\]\]", "", text)
+    text = re.sub(r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]", r"\1", text)
+    text = re.sub(r"\[https?://\S+\s([^\]]*)\]", r"\1", text)
+    text = re.sub(r"'{2,}", "", text)
+    text = re.sub(r"<[^>]+>", "", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def split_passages(text, max_words=150):
+    """``(section, passage)`` pairs: paragraphs of the page grouped up to ``max_words`` words, within a section.
+
+    Sections are the heading lines of wikitext (``== History ==``) and of the wikipediaapi text,
+    where a heading is a short line without final punctuation followed by a paragraph.
+    """
+    passages = []
+    section, current, size = "Introduction", [], 0
+
+    def flush():
+        nonlocal current, size
+        if current:
+            passages.append((section, "\n".join(current)))
+        current, size = [], 0
+
+    for paragraph in re.split(r"\n\s*\n|\n(?==)", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        lines = paragraph.split("\n")
+        heading = _HEADING_RE.match(lines[0])
+        if heading or (len(lines) > 1 and len(lines[0].split()) <= 8 and not lines[0].rstrip().endswith((".", ":", "!", "?"))):
+            flush()
+            section = heading.group(2) if heading else lines[0].strip()
+            paragraph = "\n".join(lines[1:]).strip()
+            if not paragraph:
+                continue
+        words = len(paragraph.split())
+        if current and size + words > max_words:
+            flush()
+        current.append(paragraph)
+        size += words
+    flush()
+    return passages
+
+
+class WikiPageStore:
+    """Compressed pages keyed by (language, title, revision); the newest revision of a title is served.
+
+    Args:
+        path (str): SQLite file of the store.
+        max_age (float): seconds a fetched page is served without asking Wikipedia again, None for ever.
+        max_indexes (int): passage indexes of pages kept in memory.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_age=DEFAULT_MAX_AGE, max_indexes=64):
+        self.path = path
+        self.max_age = max_age
+        self.max_indexes = max_indexes
+        self.hits = 0
+        self.misses = 0
+        self._indexes = OrderedDict()  # (language, title, revision) -> (passages, BM25)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages "
+            "(language TEXT, title TEXT, revision INTEGER, fetched REAL, text BLOB, PRIMARY KEY (language, title, revision))"
+        )
+        self._db.commit()
+
+    def _newest(self, language, title):
+        with self._lock:
+            return self._db.execute(
+                "SELECT revision, fetched, text FROM pages WHERE language = ? AND title = ? ORDER BY revision DESC, fetched DESC LIMIT 1",
+                (language, normalize_title(title)),
+            ).fetchone()
+
+    def get(self, language, title, max_age=None):
+        """``(revision, text)`` of the newest stored revision of the page, None if missing or stale."""
+        max_age = self.max_age if max_age is None else max_age
+        row = self._newest(language, title)
+        with self._lock:
+            if row is None or (max_age is not None and row[1] is not None and time.time() - row[1] > max_age):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], zlib.decompress(row[2]).decode("utf-8")
+
+    def stale(self, language, title):
+        """``(revision, text)`` of the newest stored revision whatever its age, None if missing."""
+        row = self._newest(language, title)
+        return None if row is None else (row[0], zlib.decompress(row[2]).decode("utf-8"))
+
+    def put(self, language, title, text, revision=0, fetched=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (language, title, revision, fetched, text) VALUES (?, ?, ?, ?, ?)",
+                (language, normalize_title(title), revision or 0, time.time() if fetched is None else fetched, zlib.compress(text.encode("utf-8"), 6)),
+            )
+            self._db.commit()
+
+    def put_many(self, language, pages, batch_size=1000):
+        """Stores ``(title, text, revision)`` tuples in batches of one transaction; returns their number."""
+        count = 0
+        batch = []
+
+        def write():
+            with self._lock:
+                self._db.executemany("INSERT OR REPLACE INTO pages (language, title, revision, fetched, text) VALUES (?, ?, ?, ?, ?)", batch)
+                self._db.commit()
+
+        for title, text, revision in pages:
+            # dump pages never go stale: they are refreshed by loading a newer dump
+            batch.append((language, normalize_title(title), revision or 0, None, zlib.compress(text.encode("utf-8"), 6)))
+            count += 1
+            if len(batch) >= batch_size:
+                write()
+                batch = []
+        if batch:
+            write()
+        return count
+
+    def load_dump(self, path, language="en"):
+        """Fills the store from a MediaWiki XML dump or a JSON lines file, optionally bz2/gzip compressed."""
+        name = path[:-4] if path.endswith(".bz2") else path[:-3] if path.endswith(".gz") else path
+        pages = _jsonl_pages(path) if name.endswith((".jsonl", ".json")) else _xml_pages(path)
+        return self.put_many(language, pages)
+
+    def passages(self, language, title, revision, text):
+        """Passages of a page and their BM25 index, built once per revision."""
+        key = (language, normalize_title(title), revision)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        passages = split_passages(text)
+        index = (passages, BM25([f"{section} {passage}" for section, passage in passages]))
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def stats(self):
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*), SUM(LENGTH(text)) FROM pages").fetchone()
+        return {"pages": pages[0], "stored_bytes": pages[1] or 0, "hits": self.hits, "misses": self.misses}
+
+
+def _xml_pages(path):
+    # pages are streamed and freed one by one, dumps do not fit in memory
+    with _open(path) as file:
+        root = None
+        for event, element in ElementTree.iterparse(file, events=("start", "end")):
+            if root is None:
+                root = element
+            if event != "end" or element.tag.rsplit("}", 1)[-1] != "page":
+                continue
+            fields = {child.tag.rsplit("}", 1)[-1]: child for child in element.iter()}
+            namespace = fields.get("ns")
+            redirect = "redirect" in fields
+            if (namespace is None or namespace.text == "0") and not redirect and fields.get("text") is not None:
+                revision = fields.get("revision")
+                revision_id = revision.find("{*}id") if revision is not None else None
+                yield fields["title"].text, strip_wikitext(fields["text"].text or ""), int(revision_id.text) if revision_id is not None else 0
+            # a cleared page stays a child of the root: the root is cleared, not only the page
+            root.clear()
+
+
+def _jsonl_pages(path):
+    with _open(path) as file:
+        for line in file:
+            if line.strip():
+                page = json.loads(line)
+                yield page["title"], page["text"], page.get("revid") or page.get("revision") or 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_page_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = WikiPageStore()
+        return _store
+
+
+def configure_page_store(**kwargs):
+    """Replaces the process-wide store, e.g. ``configure_page_store(path="data/wiki.sqlite", max_age=None)``."""
+    global _store
+    with _store_lock:
+        _store = WikiPageStore(**kwargs)
+        return _store
+
+
+class WikipediaUnreachable(Exception):
+    """Wikipedia could not be reached and the store has no copy of the page."""
+
+
+def fetch_page(page_title, language="en", user_agent=USER_AGENT):
+    """``(revision, text)`` of a page: from the store, or downloaded and stored; None if it does not exist.
+
+    When Wikipedia cannot be reached, the stored copy is returned whatever its age, and
+    ``WikipediaUnreachable`` is raised if there is none.
+    """
+    store = get_page_store()
+    stored = store.get(language, page_title)
+    if stored is not None:
+        return stored
+    from .clients import get_wikipedia
+    page = get_wikipedia(language, user_agent=user_agent).page(page_title)
+    stale = store.stale(language, page_title)
+    try:
+        if not page.exists():
+            # removed: an older copy is better than nothing
+            return stale
+        try:
+            revision = int(page.lastrevid)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            revision = 0
+        if stale is not None and revision and stale[0] == revision:
+            # unchanged since it was stored: only its age is reset, the text is not downloaded again
+            store.put(language, page_title, stale[1], revision=revision)
+            return stale
+        text = page.text
+    except requests.RequestException as exc:
+        # offline, or Wikipedia timing out
+        if stale is None:
+            raise WikipediaUnreachable(f"Wikipedia could not be reached: {exc}") from exc
+        return stale
+    store.put(language, page_title, text, revision=revision)
+    return revision, text
+
+
+def search_wikipedia_page(page_title: str, query: str, language: str = 'en', top_k: int = 3) -> str:
+    """Returns the passages of a Wikipedia page that are relevant to a query, instead of the whole page.
+
+    Args:
+        page_title (str): The title of the Wikipedia page.
+        query (str): What to look for in the page.
+        language (str): The language of the Wikipedia page (default is 'en' for English).
+        top_k (int): The number of passages to return.
+
+    Returns:
+        str: The relevant passages with their section, or an error message.
+    """
+    try:
+        page = fetch_page(page_title, language, user_agent=USER_AGENT)
+    except WikipediaUnreachable:
+        return f"Error: Wikipedia could not be reached and the page '{page_title}' is not stored locally."
+    if page is None:
+        return f"The page '{page_title}' does not exist on Wikipedia in the '{language}' language."
+    revision, text = page
+    passages, bm25 = get_page_store().passages(language, page_title, revision, text)
+    ranked = bm25.top_k(query, top_k)
+    if not ranked:
+        # nothing matches the query: the start of the page
+        ranked = [(index, 0.0) for index in range(min(top_k, len(passages)))]
+    # in page order, so the passages read as an excerpt
+    return "\n\n".join(f"[{passages[index][0]}]\n{passages[index][1]}" for index, _ in sorted(ranked))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fill the local Wikipedia page store from a dump')
+    parser.add_argument('command', choices=['load', 'stats'])
+    parser.add_argument('dump', nargs='?', help='MediaWiki XML dump or JSON lines file (.bz2/.gz accepted)')
+    parser.add_argument('--language', type=str, default='en')
+    parser.add_argument('--path', type=str, default=DEFAULT_PATH, help='SQLite file of the store')
+    args = parser.parse_args()
+
+    store = WikiPageStore(args.path)
+    if args.command == 'load':
+        start = time.perf_counter()
+        count = store.load_dump(args.dump, language=args.language)
+        print(f"Loaded {count} pages in {time.perf_counter() - start:.1f}s")
+    print(store.stats())
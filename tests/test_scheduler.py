@@ -0,0 +1,77 @@
+import threading
+import time
+
+from llama_crew.agents import scheduler
+from llama_crew.agents.orchestrator import Step
+from llama_crew.agents.scheduler import DagExecutor, MissingResult, StepFeed, normalize_dependencies
+
+
+def steps(*specs):
+    return [Step(agent="a", subtask=f"task {step_id}", id=step_id, depends_on=depends_on) for step_id, depends_on in specs]
+
+
+def dependencies(plan):
+    return [(step.id, step.depends_on) for step in plan]
+
+
+def test_normalize_dependencies_keeps_valid_ids():
+    plan = normalize_dependencies(steps((1, []), (2, [1]), (3, [1, 2, 3, 9])))
+    assert dependencies(plan) == [(1, []), (2, [1]), (3, [1, 2])]
+
+
+def test_normalize_dependencies_renumbers_zero_based_ids_with_their_dependencies():
+    plan = normalize_dependencies(steps((0, []), (1, [0]), (2, [1])))
+    assert dependencies(plan) == [(1, []), (2, [1]), (3, [2])]
+
+
+def test_normalize_dependencies_runs_repeated_ids_in_plan_order():
+    plan = normalize_dependencies(steps((1, []), (1, []), (2, [1])))
+    assert dependencies(plan) == [(1, []), (2, [1]), (3, [2])]
+
+
+def test_normalize_dependencies_renumbers_missing_ids_without_dependencies():
+    plan = normalize_dependencies(steps((0, []), (0, []), (0, [])))
+    assert dependencies(plan) == [(1, []), (2, []), (3, [])]
+
+
+def test_streamed_zero_based_ids_keep_their_dependencies():
+    seen = {}
+
+    def run_step(step, upstream):
+        seen[step.subtask] = sorted(record.step.subtask for record in upstream.values())
+        return step.subtask
+
+    feed = StepFeed()
+    for step in steps((0, []), (1, [0]), (2, [1])):
+        feed.put(step)
+    feed.close()
+    DagExecutor(run_step).run([], feed=feed)
+    assert seen == {"task 0": [], "task 1": ["task 0"], "task 2": ["task 1"]}
+
+
+def test_run_stops_waiting_for_a_streamed_plan_at_the_deadline(monkeypatch):
+    calls = []
+    real_wait = scheduler.wait
+
+    def counting_wait(*args, **kwargs):
+        calls.append(1)
+        return real_wait(*args, **kwargs)
+
+    monkeypatch.setattr(scheduler, "wait", counting_wait)
+    feed = StepFeed()
+    feed.put(steps((1, []))[0])
+
+    def planner():
+        # the plan goes on streaming well past the deadline of the run
+        time.sleep(0.5)
+        feed.put(steps((2, []))[0])
+        feed.close()
+
+    threading.Thread(target=planner, daemon=True).start()
+    start = time.perf_counter()
+    report = DagExecutor(lambda step, upstream: time.sleep(1.0) or step.subtask, max_workers=2).run(
+        [], deadline=start + 0.1, feed=feed
+    )
+    assert time.perf_counter() - start < 0.4
+    assert len(calls) < 20
+    assert all(isinstance(response, MissingResult) for response in report.responses())